@@ -0,0 +1,44 @@
+import glob, os, sys
+from timeit import default_timer as timer
+from parsing import CQASMParser
+from metrics.paths import getPathStats
+
+# Compares the path statistics backends on the circuits of metrics/data (or on the files given as arguments).
+# Usage: python -m metrics.benchmark [file.qasm ...]
+
+BACKENDS = {
+    "loop": dict(backend = "loop"),
+    "loop-exact": dict(backend = "loop", exact = True),
+    "vectorized": dict(backend = "vectorized"),
+}
+
+def benchmarkPathStats(fileNames: list[str]):
+    totals = { name: 0. for name in BACKENDS }
+
+    print("FileName,SubcircuitIndex,NumberOfGates," + ",".join(BACKENDS))
+    for fileName in fileNames:
+        try:
+            ast = CQASMParser.parseCQASMFile(fileName)
+        except Exception as e:
+            print(f"File {fileName} gave error: {e} and was not processed", file=sys.stderr)
+            continue
+
+        for index, subcircuit in enumerate(ast.subcircuits):
+            times = {}
+            results = {}
+            for name, args in BACKENDS.items():
+                start = timer()
+                results[name] = getPathStats(subcircuit.instructions, **args)
+                times[name] = timer() - start
+                totals[name] += times[name]
+
+            # The exact backends must agree exactly, the Decimal one up to rounding.
+            assert results["loop-exact"] == results["vectorized"], f"backends disagree on {fileName}"
+
+            print(f"{os.path.basename(fileName)},{index},{len(subcircuit.instructions)}," + ",".join(f"{times[name]:.4f}" for name in BACKENDS))
+
+    print("Total: " + ", ".join(f"{name} {t:.2f}s" for name, t in totals.items()), file=sys.stderr)
+
+if __name__ == "__main__":
+    files = sys.argv[1:] or glob.glob(os.path.dirname(os.path.realpath(__file__)) + "/data/*.qasm")
+    benchmarkPathStats(files)
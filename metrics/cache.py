@@ -0,0 +1,87 @@
+###################
+# On-disk cache of the metrics of circuit files, keyed by the SHA-256 of the file content (not its name or date).
+# One JSON file per circuit, <directory>/<hash[:2]>/<hash>.json:
+#   { metric name: { "version": version, "rows": [ { column: value } for each subcircuit ] } }
+# The result of a metric is only reused if its version is the current one: bumping the version of a metric
+# makes every file compute it again, without touching the other metrics.
+# Values that JSON does not know (Decimal) and integers beyond int64 (which can have more digits than json/str() accept)
+# are stored as strings, which is also how they end up in the outputs.
+###################
+
+import hashlib, json, os, tempfile
+from metrics.outputs import integerString
+
+def fileHash(fileName: str) -> str:
+    h = hashlib.sha256()
+    with open(fileName, "rb") as f:
+        while block := f.read(1 << 20):
+            h.update(block)
+    return h.hexdigest()
+
+def storedValue(value):
+    if isinstance(value, int) and not isinstance(value, bool) and value.bit_length() > 63:
+        return integerString(value)
+    return value
+
+class ResultCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def load(self, key: str) -> dict:
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError): # missing, or left incomplete by a crash
+            return {}
+
+    def get(self, key: str, versions: dict[str, int], ignore = ()) -> dict[str, list[dict]]:
+        # The rows of the metrics in versions that are cached at the right version, except those in ignore.
+        return { metric: entry["rows"] for metric, entry in self.load(key).items()
+                 if metric in versions and metric not in ignore and entry["version"] == versions[metric] }
+
+    def put(self, key: str, results: dict[str, list[dict]], versions: dict[str, int]):
+        # Adds (or replaces) the given metrics in the entry of key.
+        entry = self.load(key)
+        entry.update({ metric: { "version": versions[metric], "rows": [{ column: storedValue(value) for column, value in row.items() } for row in rows] }
+                       for metric, rows in results.items() })
+
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok = True)
+        fd, temporary = tempfile.mkstemp(dir = os.path.dirname(self.path(key)), suffix = ".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f, default = str)
+        os.replace(temporary, self.path(key))
+
+
+def test1():
+    from decimal import Decimal
+    with tempfile.TemporaryDirectory() as directory:
+        fileName = os.path.join(directory, "c.qasm")
+        with open(fileName, "w") as f:
+            f.write("version 1.0\nqubits 1\nh q[0]\n")
+
+        cache = ResultCache(os.path.join(directory, "cache"))
+        key = fileHash(fileName)
+        assert cache.get(key, { "a": 1 }) == {}
+
+        cache.put(key, { "a": [{ "X": 1 }], "b": [{ "Y": Decimal("0.5") }] }, { "a": 1, "b": 1 })
+        assert cache.get(key, { "a": 1, "b": 1 }) == { "a": [{ "X": 1 }], "b": [{ "Y": "0.5" }] }
+        assert cache.get(key, { "a": 1, "b": 2 }) == { "a": [{ "X": 1 }] }
+        assert cache.get(key, { "a": 1, "b": 1 }, ignore = ["a"]) == { "b": [{ "Y": "0.5" }] }
+
+        cache.put(key, { "b": [{ "Y": 2 }] }, { "b": 2 })
+        assert cache.get(key, { "a": 1, "b": 2 }) == { "a": [{ "X": 1 }], "b": [{ "Y": 2 }] }
+
+        # Integers beyond int64, even over the digit limit of str(), are kept as their digits.
+        cache.put(key, { "c": [{ "Z": 2 ** 64 }, { "Z": 10 ** 20000 }] }, { "c": 1 })
+        assert cache.get(key, { "c": 1 }) == { "c": [{ "Z": str(2 ** 64) }, { "Z": "1" + "0" * 20000 }] }
+
+        with open(fileName, "a") as f:
+            f.write("h q[0]\n")
+        assert cache.get(fileHash(fileName), { "a": 1, "b": 2 }) == {}
+
+
+if __name__ == "__main__":
+    test1()
@@ -0,0 +1,132 @@
+###################
+# Output file of a long batch run that can be interrupted and resumed.
+# The output is written to <outputFile>.partial, and each time the rows of circuit files are written, a line per file is appended
+# to the manifest <outputFile>.manifest with the file, its subcircuits and the size of the partial output at that point:
+#   {"header": ..., "offset": size after the header}    first line, identifies the settings of the run
+#   {"file": name, "subcircuits": [0, 1, ...], "offset": size after the rows of the file}
+# When resuming, the partial output is truncated to the last offset of the manifest (dropping rows written after the last
+# manifest line), and the files of the manifest are skipped. When the run is complete, the partial output replaces
+# outputFile in one os.replace, so outputFile is never seen half written.
+###################
+
+import json, os, tempfile
+
+class CheckpointedOutput:
+    def __init__(self, outputFile: str, header, resume: bool = True, newline: str = ""):
+        # header is anything JSON-serializable describing the output (e.g. its columns): a manifest with another header is not resumed.
+        self.outputFile = outputFile
+        self.partialFile = outputFile + ".partial"
+        self.manifestFile = outputFile + ".manifest"
+        self.header = header
+        self.completed = {} # file name -> subcircuit indices
+
+        lines = self.loadManifest() if resume else []
+        self.resumed = bool(lines)
+        if self.resumed:
+            for line in lines[1:]:
+                self.completed[line["file"]] = line["subcircuits"]
+            os.truncate(self.partialFile, lines[-1]["offset"])
+            self.file = open(self.partialFile, "a", newline = newline)
+            self.writeManifest(lines) # drops a line left incomplete by the interruption
+            self.manifest = open(self.manifestFile, "a")
+        else:
+            self.file = open(self.partialFile, "w", newline = newline)
+            self.manifest = None
+
+    def loadManifest(self) -> list[dict]:
+        # The valid lines of the manifest, or [] if there is nothing to resume.
+        lines = []
+        try:
+            with open(self.manifestFile) as manifest:
+                for line in manifest:
+                    try:
+                        lines.append(json.loads(line))
+                    except ValueError: # the last line, cut by the interruption
+                        break
+        except OSError:
+            return []
+
+        if not lines or lines[0].get("header") != self.header or not os.path.exists(self.partialFile) or os.path.getsize(self.partialFile) < lines[-1]["offset"]:
+            return []
+        return lines
+
+    def writeManifest(self, lines: list[dict]):
+        fd, temporary = tempfile.mkstemp(dir = os.path.dirname(os.path.realpath(self.manifestFile)), suffix = ".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+        os.replace(temporary, self.manifestFile)
+
+    def append(self, lines: list[dict]):
+        self.file.flush()
+        offset = self.file.tell()
+        self.manifest.write("".join(json.dumps({ **line, "offset": offset }) + "\n" for line in lines))
+        self.manifest.flush()
+
+    def begin(self):
+        # To call once the header of a new output is written (nothing to do when resuming).
+        if not self.resumed:
+            self.manifest = open(self.manifestFile, "w")
+            self.append([{ "header": self.header }])
+
+    def commit(self, completed: dict[str, list[int]]):
+        # To call after writing all the rows of these files (file name -> subcircuit indices).
+        self.completed.update(completed)
+        self.append([{ "file": fileName, "subcircuits": subcircuits } for fileName, subcircuits in completed.items()])
+
+    def close(self):
+        # Stops without finishing: the run can be resumed.
+        self.file.close()
+        if self.manifest is not None:
+            self.manifest.close()
+
+    def finalize(self, convert = None):
+        # convert(partialFile, fileName), if given, writes the final output from the partial one (e.g. in another format).
+        self.close()
+        if convert is None:
+            os.replace(self.partialFile, self.outputFile)
+        else:
+            temporary = self.outputFile + ".tmp"
+            convert(self.partialFile, temporary)
+            os.replace(temporary, self.outputFile)
+            os.remove(self.partialFile)
+        os.remove(self.manifestFile)
+
+
+def test1():
+    with tempfile.TemporaryDirectory() as directory:
+        outputFile = os.path.join(directory, "out.csv")
+
+        output = CheckpointedOutput(outputFile, ["A"])
+        output.file.write("A\n")
+        output.begin()
+        output.file.write("a1\n")
+        output.commit({ "a": [0] })
+        output.file.write("b1\nb2\n") # interrupted before the commit of b, and in the middle of a manifest line
+        output.close()
+        with open(output.manifestFile, "a") as manifest:
+            manifest.write('{"file": "b", "subc')
+
+        output = CheckpointedOutput(outputFile, ["A"])
+        assert output.resumed and output.completed == { "a": [0] }
+        output.begin()
+        output.file.write("b1\nb2\n")
+        output.commit({ "b": [0, 1], "c": [] })
+        output.finalize()
+
+        with open(outputFile) as f:
+            assert f.read() == "A\na1\nb1\nb2\n"
+        assert not os.path.exists(output.manifestFile) and not os.path.exists(output.partialFile)
+
+        # Nothing is resumed with another header, or when not asked to.
+        for header, resume in [(["A"], False), (["B"], True)]:
+            output = CheckpointedOutput(outputFile, ["A"])
+            output.file.write("A\n")
+            output.begin()
+            output.close()
+            output = CheckpointedOutput(outputFile, header, resume = resume)
+            assert not output.resumed and output.completed == {}
+            output.close()
+
+
+if __name__ == "__main__":
+    test1()
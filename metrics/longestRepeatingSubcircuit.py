@@ -1,4 +1,5 @@
 import typing
+import numpy as np
 from parsing import CQASMParser
 
 def longestCommonPrefix(s1, s2):
@@ -136,8 +137,90 @@ class SuffixTree:
 
 
 
+def internInstructions(c: list[CQASMParser.Instruction]) -> np.ndarray:
+    # Maps every distinct instruction to a small integer, so the engines below compare ints instead of gates.
+    # Parsed subcircuits already carry these codes (Subcircuit.codes), this is for bare instruction lists.
+    return np.asarray(CQASMParser.InstructionTable().internAll(c), dtype=np.int64)
+
+def suffixArray(codes: np.ndarray) -> (np.ndarray, np.ndarray):
+    # Prefix doubling: after the round with step k, rank orders the suffixes by their first 2k symbols.
+    n = len(codes)
+    _, rank = np.unique(codes, return_inverse=True)
+    rank = rank.astype(np.int64)
+    sa = np.argsort(rank, kind="stable")
+
+    k = 1
+    while n > 1 and rank[sa[-1]] < n - 1:
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+
+        differs = (rank[sa[1:]] != rank[sa[:-1]]) | (second[sa[1:]] != second[sa[:-1]])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.concatenate(([0], np.cumsum(differs)))
+        k *= 2
+
+    return sa, rank
+
+def longestCommonPrefixArray(codes: list[int], sa: list[int], rank: list[int]) -> list[int]:
+    # Kasai et al.: lcp[r] is the length of the common prefix of the suffixes at sa[r - 1] and sa[r].
+    n = len(codes)
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r == 0:
+            h = 0
+            continue
+
+        j = sa[r - 1]
+        while i + h < n and j + h < n and codes[i + h] == codes[j + h]:
+            h += 1
+
+        lcp[r] = h
+        if h > 0:
+            h -= 1
+
+    return lcp
+
+def longestRepeatingSubcircuitSuffixArray(c: list[CQASMParser.Instruction], codes = None):
+    codes = internInstructions(c) if codes is None else np.asarray(codes, dtype=np.int64)
+    assert len(codes) == len(c)
+
+    if len(codes) < 2:
+        return { "LongestRepeatingSubcircuit": [], "NumberOfRepetitionsOfLongestRepeatingSubcircuit": 0 }
+
+    sa, rank = suffixArray(codes)
+    sa = sa.tolist()
+    lcp = longestCommonPrefixArray(codes.tolist(), sa, rank.tolist())
+
+    maxLength = max(lcp)
+    if maxLength == 0:
+        return { "LongestRepeatingSubcircuit": [], "NumberOfRepetitionsOfLongestRepeatingSubcircuit": 0 }
+
+    # Each maximal run of consecutive lcp entries equal to maxLength is one distinct longest repeat;
+    # a run of m entries spans m + 1 suffixes, i.e. m + 1 (possibly overlapping) occurrences.
+    # Ties are broken by number of occurrences, then by earliest occurrence.
+    best = None
+    r = 1
+    while r < len(lcp):
+        if lcp[r] != maxLength:
+            r += 1
+            continue
+
+        runStart = r - 1
+        while r < len(lcp) and lcp[r] == maxLength:
+            r += 1
+
+        occurrences = r - runStart
+        firstPosition = min(sa[runStart:r])
+        if best is None or (occurrences, -firstPosition) > (best[0], -best[1]):
+            best = (occurrences, firstPosition)
+
+    return { "LongestRepeatingSubcircuit": list(c[best[1]:best[1] + maxLength]), "NumberOfRepetitionsOfLongestRepeatingSubcircuit": best[0] }
+
 # naive construction of suffix tree
-def longestRepeatingSubcircuit(c: list[CQASMParser.Instruction]):
+def longestRepeatingSubcircuitNaive(c: list[CQASMParser.Instruction], codes = None):
     t = SuffixTree()
     for i in range(len(c)):
         start = len(c) - i - 1
@@ -146,3 +229,62 @@ def longestRepeatingSubcircuit(c: list[CQASMParser.Instruction]):
     deepestInternalNode = t.deepestInternalNode()
     return { "LongestRepeatingSubcircuit": deepestInternalNode[0], "NumberOfRepetitionsOfLongestRepeatingSubcircuit": deepestInternalNode[1] if deepestInternalNode[0] != [] else 0 }
 
+ENGINES = {
+    "naive": longestRepeatingSubcircuitNaive,
+    "suffixArray": longestRepeatingSubcircuitSuffixArray,
+}
+
+def longestRepeatingSubcircuit(c: list[CQASMParser.Instruction], engine: str = "suffixArray", codes = None):
+    # When several distinct subcircuits share the maximal length, the suffix array engine reports
+    # the one with the most repetitions. The naive suffix tree is kept for reference only.
+    if engine not in ENGINES:
+        raise Exception(f"Unknown engine '{engine}', expected one of {sorted(ENGINES)}")
+
+    return ENGINES[engine](c, codes = codes)
+
+
+def test1():
+    cq = """
+    version 1.0
+
+qubits 3
+
+.testCircuit
+  h q[0]
+  cnot q[0], q[1]
+  x q[2]
+  h q[0]
+  cnot q[0], q[1]
+  x q[1]
+  h q[0]
+  cnot q[0], q[1]
+"""
+
+    subcircuit = CQASMParser.parseCQASMString(cq).subcircuits[0]
+    c = subcircuit.instructions
+
+    for engine in ENGINES:
+        result = longestRepeatingSubcircuit(c, engine = engine, codes = subcircuit.codes)
+        assert len(result["LongestRepeatingSubcircuit"]) == 2
+        assert result["NumberOfRepetitionsOfLongestRepeatingSubcircuit"] == 3
+
+def test2():
+    import random
+    rng = random.Random(42)
+    gates = [CQASMParser.Gate("h", [CQASMParser.Qubit(0)]), CQASMParser.Gate("x", [CQASMParser.Qubit(0)]), CQASMParser.Gate("x", [CQASMParser.Qubit(1)])]
+
+    for _ in range(200):
+        c = [rng.choice(gates) for _ in range(rng.randrange(0, 40))]
+        result = longestRepeatingSubcircuit(c, engine = "suffixArray")
+        sub = result["LongestRepeatingSubcircuit"]
+
+        repeatedLengths = [l for l in range(1, len(c)) if len(set(tuple(c[i:i + l]) for i in range(len(c) - l + 1))) < len(c) - l + 1]
+        assert len(sub) == max(repeatedLengths, default = 0)
+
+        occurrences = sum(1 for i in range(len(c) - len(sub) + 1) if c[i:i + len(sub)] == sub) if sub else 0
+        assert result["NumberOfRepetitionsOfLongestRepeatingSubcircuit"] == occurrences
+
+
+if __name__ == "__main__":
+    test1()
+    test2()
@@ -0,0 +1,158 @@
+###################
+# Output formats of the batch runner (processFiles.py): CSV, NDJSON (one JSON object per line) and Parquet.
+# Rows are dicts column -> value, where a missing value is "" or a missing column. Each column has one of the types:
+#   "int"       int64
+#   "float"     float64 (Decimal values are converted)
+#   "integer"   integer of any size, e.g. numbers of paths, which can have thousands of digits:
+#               written as its decimal digits (a string) in NDJSON and Parquet, so that it stays exact.
+#               str() refuses integers of more than sys.get_int_max_str_digits() digits (4300 by default):
+#               integers are written with integerString instead, which has no limit.
+#   "string"
+# CSV is written as before (Decimal values with all their digits), for compatibility with existing result files.
+# Parquet cannot be appended to, so it is written through an NDJSON file that is converted at the end (see toParquet),
+# and needs pyarrow, which is only imported then.
+###################
+
+import csv, json, os, sys
+
+FORMATS = ["csv", "ndjson", "parquet"]
+
+EXTENSIONS = { ".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson", ".parquet": "parquet" }
+
+def formatOfFile(fileName: str) -> str:
+    return EXTENSIONS.get(os.path.splitext(fileName)[1].lower(), "csv")
+
+def integerString(value: int) -> str:
+    # The decimal digits of an integer of any size, split in halves (by divmod, which has no limit) until str() accepts them.
+    if value < 0:
+        return "-" + integerString(-value)
+    limit = sys.get_int_max_str_digits()
+    if limit == 0 or value.bit_length() <= 3 * limit: # at most 3 * limit bits: less than limit digits
+        return str(value)
+    k = value.bit_length() * 3 // 20 # about half the digits
+    high, low = divmod(value, 10 ** k)
+    return integerString(high) + integerString(low).zfill(k)
+
+def textOf(value) -> str:
+    return integerString(value) if isinstance(value, int) else str(value)
+
+def typedValue(value, columnType: str):
+    if value == "" or value is None:
+        return None
+    if columnType == "int":
+        return int(value)
+    if columnType == "float":
+        return float(value)
+    return textOf(value)
+
+class CSVOutput:
+    def __init__(self, file, columnTypes: dict[str, str]):
+        self.writer = csv.DictWriter(file, fieldnames = list(columnTypes))
+
+    def writeHeader(self):
+        self.writer.writeheader()
+
+    def writeRows(self, rows: list[dict]):
+        self.writer.writerows({ column: integerString(value) if isinstance(value, int) else value for column, value in row.items() } for row in rows)
+
+class NDJSONOutput:
+    def __init__(self, file, columnTypes: dict[str, str]):
+        self.file = file
+        self.columnTypes = columnTypes
+
+    def writeHeader(self):
+        pass
+
+    def writeRows(self, rows: list[dict]):
+        self.file.write("".join(json.dumps({ column: typedValue(row.get(column, ""), t) for column, t in self.columnTypes.items() }) + "\n" for row in rows))
+
+def checkParquet():
+    # Fails before any work is done if Parquet cannot be written.
+    try:
+        import pyarrow, pyarrow.parquet
+    except ImportError:
+        raise Exception("Parquet output needs pyarrow (pip install pyarrow)")
+
+def arrowSchema(columnTypes: dict[str, str]):
+    import pyarrow as pa
+    types = { "int": pa.int64(), "float": pa.float64(), "integer": pa.string(), "string": pa.string() }
+    return pa.schema([(column, types[t]) for column, t in columnTypes.items()])
+
+def toParquet(ndjsonFile: str, parquetFile: str, columnTypes: dict[str, str], batchSize: int = 65536):
+    # Converts the output of NDJSONOutput, batchSize rows (one row group) at a time.
+    import pyarrow as pa, pyarrow.parquet as pq
+    schema = arrowSchema(columnTypes)
+    with open(ndjsonFile) as lines, pq.ParquetWriter(parquetFile, schema) as writer:
+        batch = []
+        for line in lines:
+            batch.append(json.loads(line))
+            if len(batch) == batchSize:
+                writer.write_table(pa.Table.from_pylist(batch, schema = schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema = schema))
+
+OUTPUTS = { "csv": CSVOutput, "ndjson": NDJSONOutput, "parquet": NDJSONOutput }
+
+
+def test1():
+    import io, tempfile
+    from decimal import Decimal
+    columnTypes = { "FileName": "string", "Count": "int", "Paths": "integer", "Mean": "float" }
+    rows = [{ "FileName": "a.qasm", "Count": 3, "Paths": 10**40 + 1, "Mean": Decimal("1.25") }, { "FileName": "b.qasm", "Count": "", "Paths": "", "Mean": "" }]
+
+    f = io.StringIO(newline = "")
+    output = CSVOutput(f, columnTypes)
+    output.writeHeader()
+    output.writeRows(rows)
+    assert f.getvalue() == f"FileName,Count,Paths,Mean\r\na.qasm,3,{10**40 + 1},1.25\r\nb.qasm,,,\r\n"
+
+    f = io.StringIO()
+    NDJSONOutput(f, columnTypes).writeRows(rows)
+    lines = [json.loads(line) for line in f.getvalue().splitlines()]
+    assert lines == [{ "FileName": "a.qasm", "Count": 3, "Paths": str(10**40 + 1), "Mean": 1.25 }, { "FileName": "b.qasm", "Count": None, "Paths": None, "Mean": None }]
+
+    try:
+        checkParquet()
+    except Exception:
+        return
+
+    import pyarrow.parquet as pq
+    with tempfile.TemporaryDirectory() as directory:
+        with open(directory + "/rows.ndjson", "w") as ndjson:
+            ndjson.write(f.getvalue())
+        toParquet(directory + "/rows.ndjson", directory + "/rows.parquet", columnTypes, batchSize = 1)
+        table = pq.read_table(directory + "/rows.parquet")
+        assert table.to_pylist() == lines
+        assert str(table.schema.field("Count").type) == "int64" and str(table.schema.field("Mean").type) == "double"
+
+def test2():
+    # Integers over the digit limit of str() (here 2^100000, 30103 digits) are written in full.
+    import io
+    value = 2 ** 100000
+    rows = [{ "Paths": value }, { "Paths": -value }]
+    limit = sys.get_int_max_str_digits()
+    sys.set_int_max_str_digits(0)
+    try:
+        digits = str(value)
+    finally:
+        sys.set_int_max_str_digits(limit)
+    assert integerString(value) == digits
+    assert integerString(10 ** 30000) == "1" + "0" * 30000 and integerString(-(10 ** 5000 - 1)) == "-" + "9" * 5000
+    assert integerString(10 ** 9000 + 7).endswith("0" * 100 + "7") and len(integerString(10 ** 9000 + 7)) == 9001
+
+    f = io.StringIO(newline = "")
+    output = CSVOutput(f, { "Paths": "integer" })
+    output.writeHeader()
+    output.writeRows(rows)
+    written = f.getvalue().split("\r\n")
+    assert written[1] == digits and written[2] == "-" + digits
+
+    f = io.StringIO()
+    NDJSONOutput(f, { "Paths": "integer" }).writeRows(rows)
+    assert [json.loads(line)["Paths"] for line in f.getvalue().splitlines()] == [written[1], written[2]]
+
+
+if __name__ == "__main__":
+    test1()
+    test2()
@@ -1,57 +1,156 @@
 import typing
 from parsing import CQASMParser
-import networkx
+from parsing.CompactSubcircuit import CompactSubcircuit
 import statistics
 import numpy as np
 import math
-from timeit import default_timer as timer
-from dataclasses import dataclass
-from decimal import Decimal
+import random
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal, localcontext
+from fractions import Fraction
 
-def buildDDG(c: list[CQASMParser.Instruction]):
-    start = timer()
-    graph = networkx.DiGraph()
-    graph.add_node("SOURCE")
+@dataclass
+class DDG:
+    # Data dependency graph of a list of gates, in CSR form: the successors of gate i are
+    # targets[offsets[i]:offsets[i + 1]]. Gates are numbered in instruction order, which is a topological order.
+    # SOURCE (implicit) precedes every gate without predecessor, SINK (implicit) follows every gate without successor.
+    instructions: list[CQASMParser.Instruction]
+    offsets: np.ndarray
+    targets: np.ndarray
+    numberOfQubitOperands: np.ndarray
+    sourceSuccessors: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.instructions)
+
+    def successors(self, node: int) -> np.ndarray:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def toNetworkx(self):
+        # Same graph as the former networkx-based buildDDG: nodes are "SOURCE", "SINK" and (index, gate) tuples.
+        import networkx
+
+        graph = networkx.DiGraph()
+        graph.add_node("SOURCE")
+
+        nodes = list(enumerate(self.instructions))
+        graph.add_nodes_from(nodes)
+        graph.add_node("SINK")
+
+        for j in self.sourceSuccessors.tolist():
+            graph.add_edge("SOURCE", nodes[j])
+
+        for i, node in enumerate(nodes):
+            successors = self.successors(i).tolist()
+            if not successors:
+                graph.add_edge(node, "SINK")
+            for j in successors:
+                graph.add_edge(node, nodes[j])
+
+        if len(nodes) == 0:
+            graph.add_edge("SOURCE", "SINK")
+
+        return graph
+
+def gateQubits(c):
+    # The qubit operands of every gate, as lists of indices.
+    if isinstance(c, CompactSubcircuit):
+        offsets, qubits = c.qubitOperands()
+        offsets = offsets.tolist()
+        qubits = qubits.tolist()
+        for i in range(len(c)):
+            yield qubits[offsets[i]:offsets[i + 1]]
+        return
 
-    qubitsToNode = {}
+    for instruction in c:
+        if not isinstance(instruction, CQASMParser.Gate):
+            raise Exception("Not a gate")
+
+        yield [q.index for q in instruction.operands if isinstance(q, CQASMParser.Qubit)]
+
+def gateNames(c):
+    # The name of every gate.
+    if isinstance(c, CompactSubcircuit):
+        names = c.gateNames
+        for opcode in c.opcodes.tolist():
+            yield names[opcode]
+        return
 
-    i = 0
     for instruction in c:
         if not isinstance(instruction, CQASMParser.Gate):
             raise Exception("Not a gate")
-        
-        node = (i, instruction)
-        graph.add_node(node)
-
-        for q in instruction.operands:
-            if not isinstance(q, CQASMParser.Qubit):
-                continue
-            
-            if q.index in qubitsToNode:
-                graph.add_edge(qubitsToNode[q.index], node)
-            
-            qubitsToNode[q.index] = node
-        
-        try:
-            next(graph.predecessors(node))
-        except StopIteration:
-            graph.add_edge("SOURCE", node)
-
-        i += 1
-    
-    graph.add_node("SINK")
 
-    for n in networkx.nodes(graph):
-        try:
-            next(graph.successors(n))
-        except StopIteration:
-            if n != "SINK":
-                graph.add_edge(n, "SINK")
+        yield instruction.name
 
-    assert(networkx.number_of_nodes(graph) == len(c) + 2)
-    assert(networkx.is_directed_acyclic_graph(graph))
+@dataclass
+class DurationModel:
+    # Duration of the gates (e.g. in ns) by name (case-insensitive), otherwise by number of qubit operands, otherwise default.
+    # The default model gives every gate a duration of 1, so that durations of paths are numbers of gates.
+    durations: dict[str, float] = field(default_factory = dict)
+    defaultByArity: dict[int, float] = field(default_factory = dict)
+    default: float = 1.
+
+    def __post_init__(self):
+        self.durations = { name.lower(): float(d) for name, d in self.durations.items() }
+        self.defaultByArity = { int(arity): float(d) for arity, d in self.defaultByArity.items() }
+        self.default = float(self.default)
+
+    @staticmethod
+    def fromFile(fileName: str) -> "DurationModel":
+        # JSON file such as {"durations": {"cnot": 40, "measure": 300}, "defaultByArity": {"1": 20, "2": 60}, "default": 20}.
+        with open(fileName) as f:
+            return DurationModel(**json.load(f))
+
+    def toJSON(self) -> str:
+        return json.dumps({ "durations": self.durations, "defaultByArity": self.defaultByArity, "default": self.default }, sort_keys = True)
+
+    def gateDurations(self, c) -> np.ndarray:
+        # The duration of every gate of c (list of instructions or CompactSubcircuit).
+        return np.array([self.durations.get(name.lower(), self.defaultByArity.get(len(qubits), self.default))
+                         for name, qubits in zip(gateNames(c), gateQubits(c))], dtype=np.float64)
+
+def buildDDG(c: list[CQASMParser.Instruction]) -> DDG:
+    # One pass over the instructions: the predecessors of a gate are the last gates acting on its qubits.
+    # c can also be a CompactSubcircuit, whose operand arrays are then used without creating gate objects.
+    edgeSources = []
+    edgeTargets = []
+    numberOfQubitOperands = np.zeros(len(c), dtype=np.int8)
+    hasPredecessor = np.zeros(len(c), dtype=bool)
 
-    return graph
+    qubitsToNode = {}
+
+    for i, qubits in enumerate(gateQubits(c)):
+        numberOfQubitOperands[i] = len(qubits)
+
+        predecessors = []
+        for q in qubits:
+            predecessor = qubitsToNode.get(q)
+            if predecessor is not None and predecessor != i and predecessor not in predecessors:
+                predecessors += [predecessor]
+
+            qubitsToNode[q] = i
+
+        if predecessors:
+            hasPredecessor[i] = True
+            edgeSources += predecessors
+            edgeTargets += [i] * len(predecessors)
+
+    edgeSources = np.array(edgeSources, dtype=np.int64)
+    edgeTargets = np.array(edgeTargets, dtype=np.int64)
+
+    # Edges were generated by increasing target; a stable sort by source keeps successors sorted.
+    order = np.argsort(edgeSources, kind="stable")
+    offsets = np.zeros(len(c) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edgeSources, minlength=len(c)), out=offsets[1:])
+
+    return DDG(
+        instructions = c,
+        offsets = offsets,
+        targets = edgeTargets[order],
+        numberOfQubitOperands = numberOfQubitOperands,
+        sourceSuccessors = np.flatnonzero(~hasPredecessor),
+    )
 
 @dataclass
 class PropagatedData:
@@ -62,31 +161,65 @@ class PropagatedData:
     numberOfPathsWithMaxLength: int
     maxNumberOfTwoQubitGatesInPathsWithMaxLength: int
     numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates: int
+    # Only set in exact mode, where meanLengthOfPath and varianceLengthOfPath are only computed at SOURCE.
+    sumOfLengthsOfPaths: int = None
+    sumOfSquaredLengthsOfPaths: int = None
+    # Only set when gate durations are given: the longest duration of a path, i.e. the length of an ASAP schedule.
+    maxDurationOfPath: float = None
 
-def getParentMean(graph, parent, nodesData, parentPathCount):
+def getParentMean(children, nodesData, parentPathCount):
     acc = 0
-    for n in graph.successors(parent):
+    for n in children:
         acc += nodesData[n].numberOfPaths * (nodesData[n].meanLengthOfPath + 1)
     return Decimal(acc) / Decimal(parentPathCount)
 
-def getParentVariance(graph, parent, nodesData, parentPathCount, parentMean):
+def getParentVariance(children, nodesData, parentPathCount, parentMean):
     acc = 0
-    for n in graph.successors(parent):
+    for n in children:
         acc += nodesData[n].numberOfPaths * (nodesData[n].varianceLengthOfPath + ((nodesData[n].meanLengthOfPath + 1) - parentMean)**2)
     return Decimal(acc) / Decimal(parentPathCount)
 
-def getParentMaxLengthOfPath(graph, parent, nodesData):
-    maxLengthOfChildrenPath = max(nodesData[n].maxLengthOfPath for n in graph.successors(parent))
-    parentNumberOfPathsWithMaxLength = sum(nodesData[n].numberOfPathsWithMaxLength for n in graph.successors(parent) if nodesData[n].maxLengthOfPath == maxLengthOfChildrenPath)
+def getParentSums(children, nodesData):
+    # Exact mode: a path of length l from a child has length l + 1 from the parent,
+    # so the sum of l becomes sum(l) + count and the sum of l^2 becomes sum(l^2) + 2 sum(l) + count.
+    sumOfLengths = 0
+    sumOfSquaredLengths = 0
+    for n in children:
+        d = nodesData[n]
+        sumOfLengths += d.sumOfLengthsOfPaths + d.numberOfPaths
+        sumOfSquaredLengths += d.sumOfSquaredLengthsOfPaths + 2 * d.sumOfLengthsOfPaths + d.numberOfPaths
+    return (sumOfLengths, sumOfSquaredLengths)
+
+def exactRatio(numerator: int, denominator: int) -> Decimal:
+    # numerator / denominator, rounded to the Decimal precision. Converting huge integers to Decimal takes quadratic time
+    # (numbers of paths of iterated subcircuits have millions of digits), so these are first divided as integers,
+    # keeping about 160 significant bits.
+    if max(abs(numerator).bit_length(), denominator.bit_length()) <= 4096:
+        return Decimal(numerator) / Decimal(denominator)
+
+    shift = max(0, 160 + denominator.bit_length() - abs(numerator).bit_length())
+    quotient = (abs(numerator) << shift) // denominator
+    with localcontext() as context:
+        context.prec += 20
+        result = Decimal(quotient) / Decimal(2) ** shift
+    return +result if numerator >= 0 else -result
+
+def exactMoments(numberOfPaths, sumOfLengths, sumOfSquaredLengths):
+    mean = exactRatio(sumOfLengths, numberOfPaths)
+    variance = exactRatio(sumOfSquaredLengths * numberOfPaths - sumOfLengths * sumOfLengths, numberOfPaths * numberOfPaths)
+    return (mean, variance)
+
+def getParentMaxLengthOfPath(children, nodesData):
+    maxLengthOfChildrenPath = max(nodesData[n].maxLengthOfPath for n in children)
+    parentNumberOfPathsWithMaxLength = sum(nodesData[n].numberOfPathsWithMaxLength for n in children if nodesData[n].maxLengthOfPath == maxLengthOfChildrenPath)
 
     return (maxLengthOfChildrenPath + 1, parentNumberOfPathsWithMaxLength)
 
-def twoQubitGates(graph, parent, nodesData, parentMaxLengthOfPath):
-    maxNumberOfTwoQubitGatesInPathsWithMaxLength = max(nodesData[n].maxNumberOfTwoQubitGatesInPathsWithMaxLength for n in graph.successors(parent) if nodesData[n].maxLengthOfPath == (parentMaxLengthOfPath - 1))
+def twoQubitGates(children, nodesData, parentMaxLengthOfPath, numberOfQubitOperands):
+    maxNumberOfTwoQubitGatesInPathsWithMaxLength = max(nodesData[n].maxNumberOfTwoQubitGatesInPathsWithMaxLength for n in children if nodesData[n].maxLengthOfPath == (parentMaxLengthOfPath - 1))
 
-    numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = sum(nodesData[n].numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates for n in graph.successors(parent) if nodesData[n].maxLengthOfPath == (parentMaxLengthOfPath - 1) and nodesData[n].maxNumberOfTwoQubitGatesInPathsWithMaxLength == maxNumberOfTwoQubitGatesInPathsWithMaxLength)
+    numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = sum(nodesData[n].numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates for n in children if nodesData[n].maxLengthOfPath == (parentMaxLengthOfPath - 1) and nodesData[n].maxNumberOfTwoQubitGatesInPathsWithMaxLength == maxNumberOfTwoQubitGatesInPathsWithMaxLength)
 
-    numberOfQubitOperands = 0 if isinstance(parent, str) else sum(1 for op in parent[1].operands if isinstance(op, CQASMParser.Qubit))
     assert numberOfQubitOperands <= 2, "contains a 3+ qubits gate"
     if numberOfQubitOperands == 2:
         maxNumberOfTwoQubitGatesInPathsWithMaxLength += 1
@@ -94,35 +227,55 @@ def twoQubitGates(graph, parent, nodesData, parentMaxLengthOfPath):
     return (maxNumberOfTwoQubitGatesInPathsWithMaxLength, numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates)
     
 
-def pathStatistics(graph):
-    reversedGraphView = graph.reverse(copy=False)
-
-    nodesData = { "SINK": PropagatedData(
+def propagatePathData(ddg: DDG, exact: bool = False, durations: np.ndarray = None) -> list[PropagatedData]:
+    # Returns the data of every node, indexed by gate index, followed by SINK (index len(ddg)) and SOURCE (index len(ddg) + 1).
+    # Nodes are visited in reverse instruction order, so that all successors of a node are done before it.
+    # With exact=True, the moments of the path lengths are propagated as Python integers
+    # (sum of lengths and of squared lengths) and only divided once, at SOURCE.
+    # durations (e.g. DurationModel.gateDurations) gives the weight of each gate for maxDurationOfPath.
+    sink = len(ddg)
+    source = len(ddg) + 1
+
+    offsets = ddg.offsets.tolist()
+    targets = ddg.targets.tolist()
+    numberOfQubitOperands = ddg.numberOfQubitOperands.tolist() + [0, 0]
+    weights = durations.tolist() + [0., 0.] if durations is not None else None
+
+    nodesData = [None] * (len(ddg) + 2)
+    nodesData[sink] = PropagatedData(
                 numberOfPaths = 1,
-                meanLengthOfPath = Decimal(-1),
-                varianceLengthOfPath = Decimal(0),
+                meanLengthOfPath = None if exact else Decimal(-1),
+                varianceLengthOfPath = None if exact else Decimal(0),
                 maxLengthOfPath = 0,
                 numberOfPathsWithMaxLength = 1,
                 maxNumberOfTwoQubitGatesInPathsWithMaxLength = 0,
                 numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = 1,
+                sumOfLengthsOfPaths = -1 if exact else None,
+                sumOfSquaredLengthsOfPaths = 1 if exact else None,
+                maxDurationOfPath = 0. if durations is not None else None,
             )
-        }
-
-    for node in networkx.topological_sort(reversedGraphView):
-        if node == "SINK":
-            continue
 
-        assert(node not in nodesData)
+    for node in [*range(len(ddg) - 1, -1, -1), source]:
+        children = ddg.sourceSuccessors.tolist() if node == source else targets[offsets[node]:offsets[node + 1]]
+        if not children:
+            children = [sink]
 
-        numberOfPaths = sum(nodesData[s].numberOfPaths for s in graph.successors(node))
-        meanLengthOfPath = getParentMean(graph, node, nodesData, numberOfPaths)
-        varianceLengthOfPath = getParentVariance(graph, node, nodesData, numberOfPaths, meanLengthOfPath)
-        maxLengthOfPath, numberOfPathsWithMaxLength = getParentMaxLengthOfPath(graph, node, nodesData)
+        numberOfPaths = sum(nodesData[s].numberOfPaths for s in children)
+        if exact:
+            sumOfLengthsOfPaths, sumOfSquaredLengthsOfPaths = getParentSums(children, nodesData)
+            meanLengthOfPath, varianceLengthOfPath = (None, None)
+        else:
+            sumOfLengthsOfPaths, sumOfSquaredLengthsOfPaths = (None, None)
+            meanLengthOfPath = getParentMean(children, nodesData, numberOfPaths)
+            varianceLengthOfPath = getParentVariance(children, nodesData, numberOfPaths, meanLengthOfPath)
+        maxLengthOfPath, numberOfPathsWithMaxLength = getParentMaxLengthOfPath(children, nodesData)
 
-        (maxNumberOfTwoQubitGatesInPathsWithMaxLength, numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates) = twoQubitGates(graph, node, nodesData, maxLengthOfPath)
+        (maxNumberOfTwoQubitGatesInPathsWithMaxLength, numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates) = twoQubitGates(children, nodesData, maxLengthOfPath, numberOfQubitOperands[node])
 
         assert(numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates <= numberOfPathsWithMaxLength)
 
+        maxDurationOfPath = weights[node] + max(nodesData[s].maxDurationOfPath for s in children) if durations is not None else None
+
         nodesData[node] = PropagatedData(
                 numberOfPaths = numberOfPaths,
                 meanLengthOfPath = meanLengthOfPath,
@@ -131,16 +284,324 @@ def pathStatistics(graph):
                 numberOfPathsWithMaxLength = numberOfPathsWithMaxLength,
                 maxNumberOfTwoQubitGatesInPathsWithMaxLength = maxNumberOfTwoQubitGatesInPathsWithMaxLength,
                 numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates,
+                sumOfLengthsOfPaths = sumOfLengthsOfPaths,
+                sumOfSquaredLengthsOfPaths = sumOfSquaredLengthsOfPaths,
+                maxDurationOfPath = maxDurationOfPath,
             )
 
-    return nodesData["SOURCE"]
-
-
-
-def getPathStats(c: list[CQASMParser.Instruction]):
-    graph = buildDDG(c)
+    if exact:
+        nodesData[source].meanLengthOfPath, nodesData[source].varianceLengthOfPath = exactMoments(nodesData[source].numberOfPaths, nodesData[source].sumOfLengthsOfPaths, nodesData[source].sumOfSquaredLengthsOfPaths)
+
+    return nodesData
+
+def pathStatistics(ddg: DDG, exact: bool = False, durations: np.ndarray = None) -> PropagatedData:
+    return propagatePathData(ddg, exact = exact, durations = durations)[-1]
+
+def gatherSegments(offsets, values, nodes):
+    # Concatenates values[offsets[v]:offsets[v + 1]] for v in nodes; returns them with the start of each segment.
+    starts = offsets[nodes]
+    lengths = offsets[nodes + 1] - starts
+    segmentStarts = np.zeros(len(nodes), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=segmentStarts[1:])
+    segments = np.repeat(np.arange(len(nodes)), lengths)
+    return values[starts[segments] + np.arange(len(segments)) - segmentStarts[segments]], segmentStarts, segments
+
+def pathStatisticsVectorized(ddg: DDG, durations: np.ndarray = None) -> PropagatedData:
+    # Same result as pathStatistics(ddg, exact=True, durations=durations), but the nodes are processed frontier by frontier
+    # (all nodes whose successors are done) with NumPy segment reductions instead of one by one.
+    # Counts and moments are int64 until they could overflow, then object arrays of Python ints.
+    assert (ddg.numberOfQubitOperands <= 2).all(), "contains a 3+ qubits gate"
+
+    n = len(ddg)
+    sink = n
+    source = n + 1
+
+    # Successors with explicit SINK and SOURCE: gates without successor point to SINK.
+    outDegree = np.diff(ddg.offsets)
+    sourceSuccessors = ddg.sourceSuccessors if len(ddg.sourceSuccessors) > 0 else np.array([sink], dtype=np.int64)
+    degrees = np.concatenate((np.maximum(outDegree, 1), [0, len(sourceSuccessors)]))
+    offsets = np.zeros(n + 3, dtype=np.int64)
+    np.cumsum(degrees, out=offsets[1:])
+
+    targets = np.empty(offsets[-1], dtype=np.int64)
+    edgeOwners = np.repeat(np.arange(n), outDegree)
+    targets[offsets[edgeOwners] + np.arange(len(ddg.targets)) - ddg.offsets[edgeOwners]] = ddg.targets
+    targets[offsets[:n][outDegree == 0]] = sink
+    targets[offsets[source]:] = sourceSuccessors
+
+    # Predecessors, to find the next frontier.
+    edgeSources = np.repeat(np.arange(n + 2), degrees)
+    order = np.argsort(targets, kind="stable")
+    predecessorOffsets = np.zeros(n + 3, dtype=np.int64)
+    np.cumsum(np.bincount(targets, minlength=n + 2), out=predecessorOffsets[1:])
+    predecessors = edgeSources[order]
+
+    isTwoQubitGate = np.concatenate((ddg.numberOfQubitOperands == 2, [False, False]))
+
+    maxLength = np.zeros(n + 2, dtype=np.int64)
+    maxTwoQubitGates = np.zeros(n + 2, dtype=np.int64)
+    weights = np.concatenate((durations, [0., 0.])) if durations is not None else np.zeros(n + 2)
+    maxDuration = np.zeros(n + 2)
+    counts = {
+        "paths": np.zeros(n + 2, dtype=np.int64),
+        "pathsWithMaxLength": np.zeros(n + 2, dtype=np.int64),
+        "pathsWithMaxTwoQubitGates": np.zeros(n + 2, dtype=np.int64),
+        "sumOfLengths": np.zeros(n + 2, dtype=np.int64),
+        "sumOfSquaredLengths": np.zeros(n + 2, dtype=np.int64),
+    }
+    for k, v in {"paths": 1, "pathsWithMaxLength": 1, "pathsWithMaxTwoQubitGates": 1, "sumOfLengths": -1, "sumOfSquaredLengths": 1}.items():
+        counts[k][sink] = v
+
+    remaining = degrees.copy()
+    done = np.array([sink], dtype=np.int64)
+    while True:
+        frontierPredecessors, _, _ = gatherSegments(predecessorOffsets, predecessors, done)
+        candidates, decrements = np.unique(frontierPredecessors, return_counts=True)
+        remaining[candidates] -= decrements
+        frontier = candidates[remaining[candidates] == 0]
+        if len(frontier) == 0:
+            break
+
+        children, segmentStarts, segments = gatherSegments(offsets, targets, frontier)
+
+        if counts["paths"].dtype != object:
+            maxSegmentLength = int(np.diff(np.append(segmentStarts, len(children))).max())
+            bound = (int(np.abs(counts["sumOfSquaredLengths"][children]).max()) + 2 * int(np.abs(counts["sumOfLengths"][children]).max()) + int(counts["paths"][children].max())) * maxSegmentLength
+            if bound >= np.iinfo(np.int64).max:
+                counts = { k: v.astype(object) for k, v in counts.items() }
+
+        paths = counts["paths"][children]
+        sumOfLengths = counts["sumOfLengths"][children]
+        counts["paths"][frontier] = np.add.reduceat(paths, segmentStarts)
+        counts["sumOfLengths"][frontier] = np.add.reduceat(sumOfLengths + paths, segmentStarts)
+        counts["sumOfSquaredLengths"][frontier] = np.add.reduceat(counts["sumOfSquaredLengths"][children] + 2 * sumOfLengths + paths, segmentStarts)
+
+        childrenMaxLength = maxLength[children]
+        frontierMaxLength = np.maximum.reduceat(childrenMaxLength, segmentStarts)
+        isCritical = childrenMaxLength == frontierMaxLength[segments]
+        counts["pathsWithMaxLength"][frontier] = np.add.reduceat(np.where(isCritical, counts["pathsWithMaxLength"][children], 0), segmentStarts)
+
+        childrenTwoQubitGates = np.where(isCritical, maxTwoQubitGates[children], -1)
+        frontierTwoQubitGates = np.maximum.reduceat(childrenTwoQubitGates, segmentStarts)
+        isCriticalWithMaxTwoQubitGates = isCritical & (childrenTwoQubitGates == frontierTwoQubitGates[segments])
+        counts["pathsWithMaxTwoQubitGates"][frontier] = np.add.reduceat(np.where(isCriticalWithMaxTwoQubitGates, counts["pathsWithMaxTwoQubitGates"][children], 0), segmentStarts)
+
+        maxLength[frontier] = frontierMaxLength + 1
+        maxTwoQubitGates[frontier] = frontierTwoQubitGates + isTwoQubitGate[frontier]
+        maxDuration[frontier] = np.maximum.reduceat(maxDuration[children], segmentStarts) + weights[frontier]
+
+        done = frontier
+
+    assert remaining[source] == 0
+
+    numberOfPaths = int(counts["paths"][source])
+    sumOfLengthsOfPaths = int(counts["sumOfLengths"][source])
+    sumOfSquaredLengthsOfPaths = int(counts["sumOfSquaredLengths"][source])
+    meanLengthOfPath, varianceLengthOfPath = exactMoments(numberOfPaths, sumOfLengthsOfPaths, sumOfSquaredLengthsOfPaths)
+
+    return PropagatedData(
+        numberOfPaths = numberOfPaths,
+        meanLengthOfPath = meanLengthOfPath,
+        varianceLengthOfPath = varianceLengthOfPath,
+        maxLengthOfPath = int(maxLength[source]),
+        numberOfPathsWithMaxLength = int(counts["pathsWithMaxLength"][source]),
+        maxNumberOfTwoQubitGatesInPathsWithMaxLength = int(maxTwoQubitGates[source]),
+        numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = int(counts["pathsWithMaxTwoQubitGates"][source]),
+        sumOfLengthsOfPaths = sumOfLengthsOfPaths,
+        sumOfSquaredLengthsOfPaths = sumOfSquaredLengthsOfPaths,
+        maxDurationOfPath = float(maxDuration[source]) if durations is not None else None,
+    )
+
+
+
+def criticalPathLength(ddg: DDG) -> int:
+    # Number of gates in the critical path, i.e. getPathStats(c)["NumberOfGatesInCriticalPath"], without counting paths.
+    offsets = ddg.offsets.tolist()
+    targets = ddg.targets.tolist()
+    depth = [0] * len(ddg) # number of gates in the longest path from the gate (inclusive) to SINK
+    for node in range(len(ddg) - 1, -1, -1):
+        depth[node] = 1 + max((depth[s] for s in targets[offsets[node]:offsets[node + 1]]), default = 0)
+    return max(depth, default = 0)
+
+def criticalPathDuration(ddg: DDG, durations: np.ndarray) -> float:
+    # The longest duration of a path (ASAP schedule length), i.e. getPathStats(c, durations=...)["CriticalPathDuration"],
+    # without counting paths. durations is the duration of each gate (e.g. DurationModel.gateDurations).
+    offsets = ddg.offsets.tolist()
+    targets = ddg.targets.tolist()
+    weights = durations.tolist()
+    finish = [0.] * len(ddg) # longest duration from the start of the gate to SINK
+    for node in range(len(ddg) - 1, -1, -1):
+        finish[node] = weights[node] + max((finish[s] for s in targets[offsets[node]:offsets[node + 1]]), default = 0.)
+    return max(finish, default = 0.)
 
-    stats = pathStatistics(graph)
+@dataclass
+class PathLengthHistogram:
+    # counts[i] is the number of paths with minLength + i gates: from SOURCE to SINK, or from a gate (inclusive) to SINK while propagating.
+    minLength: int
+    counts: np.ndarray # int64, or object (Python integers) where they could overflow
+
+INT64_MAX = np.iinfo(np.int64).max
+
+def addHistograms(histograms: list[PathLengthHistogram], overflows: bool) -> PathLengthHistogram:
+    # The sum of the histograms, aligned by length. overflows says whether the counts may not fit in int64.
+    histograms = [h for h in histograms if len(h.counts)] or histograms[:1]
+    minLength = min(h.minLength for h in histograms)
+    counts = np.zeros(max(h.minLength + len(h.counts) for h in histograms) - minLength, dtype = object if overflows else np.int64)
+    for h in histograms:
+        # int64 counts become Python integers before being added to object ones, which would otherwise stay int64 and wrap.
+        counts[h.minLength - minLength:h.minLength - minLength + len(h.counts)] += h.counts.astype(object) if overflows else h.counts
+    return PathLengthHistogram(minLength = minLength, counts = counts)
+
+def truncateHistogram(h: PathLengthHistogram, low: int, high: int) -> PathLengthHistogram:
+    # Only the lengths in [low, high] (an empty histogram starts at low).
+    start = min(max(low - h.minLength, 0), len(h.counts))
+    end = max(min(high - h.minLength + 1, len(h.counts)), start)
+    return PathLengthHistogram(minLength = h.minLength + start if end > start else low, counts = h.counts[start:end])
+
+def pathLengthHistogram(ddg: DDG, window: tuple[int, int] = None) -> PathLengthHistogram:
+    # The number of paths from SOURCE to SINK of every length (number of gates), exactly, without enumerating the paths:
+    # the histogram of a node is the sum of those of its successors, shifted by one. Nodes are visited in reverse instruction
+    # order as in propagatePathData, and a histogram is dropped once all its predecessors are done.
+    # The cost is bounded by nodes x depth. Counts are int64 NumPy arrays, and object arrays of Python integers at the nodes
+    # whose number of paths does not fit in int64.
+    # With window = (low, high), only the paths with low to high gates are counted: each node keeps only the lengths that can
+    # still end in the window, given the shortest and the longest prefix from SOURCE to the node.
+    sink = len(ddg)
+    source = len(ddg) + 1
+    offsets = ddg.offsets.tolist()
+    targets = ddg.targets.tolist()
+    sourceSuccessors = ddg.sourceSuccessors.tolist()
+
+    numberOfParents = [0] * (len(ddg) + 2)
+    for s in targets + sourceSuccessors:
+        numberOfParents[s] += 1
+
+    if window is not None:
+        # Numbers of gates before each node on the shortest and the longest path from SOURCE.
+        minPrefix = [0] * (len(ddg) + 2)
+        maxPrefix = [0] * (len(ddg) + 2)
+        hasParent = [False] * (len(ddg) + 2)
+        for node in range(len(ddg)):
+            for s in targets[offsets[node]:offsets[node + 1]]:
+                minPrefix[s] = min(minPrefix[s], minPrefix[node] + 1) if hasParent[s] else minPrefix[node] + 1
+                maxPrefix[s] = max(maxPrefix[s], maxPrefix[node] + 1)
+                hasParent[s] = True
+
+    histograms = { sink: PathLengthHistogram(minLength = 0, counts = np.ones(1, dtype = np.int64)) }
+    numberOfPaths = { sink: 1 } # bounds of the totals of the histograms, to choose between int64 and object
+    for node in [*range(len(ddg) - 1, -1, -1), source]:
+        children = sourceSuccessors if node == source else targets[offsets[node]:offsets[node + 1]]
+        if not children:
+            children = [sink]
+
+        total = sum(numberOfPaths[c] for c in children)
+        h = addHistograms([histograms[c] for c in children], overflows = total > INT64_MAX)
+        if node != source:
+            h.minLength += 1
+        if window is not None:
+            h = truncateHistogram(h, window[0] - maxPrefix[node], window[1] - minPrefix[node]) if node != source else truncateHistogram(h, *window)
+        histograms[node] = h
+        numberOfPaths[node] = total
+
+        for c in children:
+            numberOfParents[c] -= 1
+            if numberOfParents[c] == 0 and c != sink:
+                del histograms[c], numberOfPaths[c]
+
+    return histograms[source]
+
+def histogramQuantile(h: PathLengthHistogram, q) -> int:
+    # The smallest length such that at least a fraction q (0 <= q <= 1, taken exactly) of the paths are not longer, e.g. the
+    # median for q = 0.5 (the lower one when there are two). None if there is no path.
+    counts = h.counts.tolist()
+    total = sum(counts)
+    if total == 0:
+        return None
+    target = max(math.ceil(Fraction(q) * total), 1)
+    cumulative = 0
+    for i, count in enumerate(counts):
+        cumulative += count
+        if cumulative >= target:
+            return h.minLength + i
+
+def childrenOf(ddg: DDG, node: int) -> list[int]:
+    # Successors of a node in the numbering of propagatePathData (SINK is len(ddg), SOURCE is len(ddg) + 1).
+    children = ddg.sourceSuccessors.tolist() if node == len(ddg) + 1 else ddg.successors(node).tolist()
+    return children or [len(ddg)]
+
+def criticalPaths(ddg: DDG, k: int, nodesData: list[PropagatedData] = None, maxTwoQubitGates: bool = False) -> typing.Iterator[list[int]]:
+    # Up to k critical paths, as lists of gate indices from SOURCE to SINK (both excluded), without enumerating the others:
+    # every child on a critical path from its parent starts a critical path itself, so each path takes O(depth) steps.
+    # With maxTwoQubitGates, only the critical paths with the most two-qubit gates (NumberOfCriticalPathsWithMaxTwoQubitsGates).
+    # nodesData is propagatePathData(ddg) (in either mode), when the caller already has it.
+    nodesData = propagatePathData(ddg, exact = True) if nodesData is None else nodesData # no Decimal moments at every node
+    sink = len(ddg)
+    numberOfQubitOperands = ddg.numberOfQubitOperands.tolist() + [0, 0]
+
+    def criticalChildren(node):
+        d = nodesData[node]
+        twoQubitGates = d.maxNumberOfTwoQubitGatesInPathsWithMaxLength - (numberOfQubitOperands[node] == 2)
+        return [c for c in childrenOf(ddg, node) if nodesData[c].maxLengthOfPath == d.maxLengthOfPath - 1
+                and (not maxTwoQubitGates or nodesData[c].maxNumberOfTwoQubitGatesInPathsWithMaxLength == twoQubitGates)]
+
+    path = []
+    stack = [iter(criticalChildren(sink + 1))]
+    while stack and k > 0:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            if path:
+                path.pop()
+        elif node == sink:
+            yield list(path)
+            k -= 1
+        else:
+            path.append(node)
+            stack.append(iter(criticalChildren(node)))
+
+def samplePaths(ddg: DDG, k: int, nodesData: list[PropagatedData] = None, critical: bool = False, rng: random.Random = None) -> list[list[int]]:
+    # k paths from SOURCE to SINK drawn uniformly at random (with replacement), as lists of gate indices: each step picks a child
+    # with probability proportional to its number of paths, so each path takes O(depth * fanout) steps, however many paths there are.
+    # With critical, among the critical paths only. nodesData is propagatePathData(ddg) (in either mode), when the caller already has it.
+    nodesData = propagatePathData(ddg, exact = True) if nodesData is None else nodesData # no Decimal moments at every node
+    rng = random.Random() if rng is None else rng
+    sink = len(ddg)
+
+    def weight(parent, child):
+        if not critical:
+            return nodesData[child].numberOfPaths
+        return nodesData[child].numberOfPathsWithMaxLength if nodesData[child].maxLengthOfPath == nodesData[parent].maxLengthOfPath - 1 else 0
+
+    paths = []
+    for _ in range(k):
+        path = []
+        node = sink + 1
+        while node != sink:
+            children = childrenOf(ddg, node)
+            weights = [weight(node, c) for c in children]
+            r = rng.randrange(sum(weights)) # exact, even with thousands of digits
+            for node, w in zip(children, weights):
+                r -= w
+                if r < 0:
+                    break
+            if node != sink:
+                path.append(node)
+        paths.append(path)
+    return paths
+
+def getPathStats(c: list[CQASMParser.Instruction], exact: bool = False, backend: str = "loop", ddg: DDG = None, durations: DurationModel = None):
+    # backend="vectorized" is always exact; it pays off on wide circuits, where frontiers are large.
+    # ddg is buildDDG(c), when the caller already has it (c is then not used).
+    # With durations, also gives CriticalPathDuration, the longest duration of a path, computed in the same sweep.
+    graph = buildDDG(c) if ddg is None else ddg
+    gateDurations = durations.gateDurations(graph.instructions) if durations is not None else None
+
+    if backend == "loop":
+        stats = pathStatistics(graph, exact = exact, durations = gateDurations)
+    elif backend == "vectorized":
+        stats = pathStatisticsVectorized(graph, durations = gateDurations)
+    else:
+        raise Exception(f"Unknown backend '{backend}', expected 'loop' or 'vectorized'")
 
     return {
         "NumberOfGatesInCriticalPath": stats.maxLengthOfPath - 1,
@@ -149,6 +610,97 @@ def getPathStats(c: list[CQASMParser.Instruction]):
         "NumberOfCriticalPathsWithMaxTwoQubitsGates": stats.numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates,
         "PathLengthMean": stats.meanLengthOfPath,
         "PathLengthStandardDeviation": stats.varianceLengthOfPath.sqrt(),
+        **({ "CriticalPathDuration": stats.maxDurationOfPath } if durations is not None else {}),
+    }
+
+@dataclass
+class ForwardPathData(PropagatedData):
+    # Data of the paths from SOURCE to a gate (inclusive), in exact mode.
+    hasSuccessor: bool = False
+
+def mergePaths(nodesData: list[PropagatedData]) -> ForwardPathData:
+    maxLengthOfPath = max(d.maxLengthOfPath for d in nodesData)
+    critical = [d for d in nodesData if d.maxLengthOfPath == maxLengthOfPath]
+    maxNumberOfTwoQubitGates = max(d.maxNumberOfTwoQubitGatesInPathsWithMaxLength for d in critical)
+
+    return ForwardPathData(
+        numberOfPaths = sum(d.numberOfPaths for d in nodesData),
+        meanLengthOfPath = None,
+        varianceLengthOfPath = None,
+        maxLengthOfPath = maxLengthOfPath,
+        numberOfPathsWithMaxLength = sum(d.numberOfPathsWithMaxLength for d in critical),
+        maxNumberOfTwoQubitGatesInPathsWithMaxLength = maxNumberOfTwoQubitGates,
+        numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = sum(d.numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates for d in critical if d.maxNumberOfTwoQubitGatesInPathsWithMaxLength == maxNumberOfTwoQubitGates),
+        sumOfLengthsOfPaths = sum(d.sumOfLengthsOfPaths for d in nodesData),
+        sumOfSquaredLengthsOfPaths = sum(d.sumOfSquaredLengthsOfPaths for d in nodesData),
+    )
+
+def extendPaths(d: ForwardPathData, numberOfQubitOperands: int) -> ForwardPathData:
+    # Appends one gate to all the paths of d.
+    assert numberOfQubitOperands <= 2, "contains a 3+ qubits gate"
+
+    d.sumOfSquaredLengthsOfPaths += 2 * d.sumOfLengthsOfPaths + d.numberOfPaths
+    d.sumOfLengthsOfPaths += d.numberOfPaths
+    d.maxLengthOfPath += 1
+    if numberOfQubitOperands == 2:
+        d.maxNumberOfTwoQubitGatesInPathsWithMaxLength += 1
+    return d
+
+def getPathStatsStreaming(gates: typing.Iterable[CQASMParser.Instruction]):
+    # Same result as getPathStats(c, exact=True), computed from SOURCE forwards while consuming the gates one by one.
+    # Only the data of the last gate on each qubit is kept, so memory is O(number of qubits), not O(number of gates).
+    source = ForwardPathData(
+        numberOfPaths = 1,
+        meanLengthOfPath = None,
+        varianceLengthOfPath = None,
+        maxLengthOfPath = 0,
+        numberOfPathsWithMaxLength = 1,
+        maxNumberOfTwoQubitGatesInPathsWithMaxLength = 0,
+        numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates = 1,
+        sumOfLengthsOfPaths = 0,
+        sumOfSquaredLengthsOfPaths = 0,
+    )
+
+    lastOnQubit = {}
+    gatesWithoutQubits = None # merged data of the gates without qubit operand, which go straight to SINK
+
+    for instruction in gates:
+        if not isinstance(instruction, CQASMParser.Gate):
+            raise Exception("Not a gate")
+
+        qubits = [q.index for q in instruction.operands if isinstance(q, CQASMParser.Qubit)]
+
+        predecessors = []
+        for q in qubits:
+            predecessor = lastOnQubit.get(q)
+            if predecessor is not None and not any(predecessor is p for p in predecessors):
+                predecessors += [predecessor]
+
+        for p in predecessors:
+            p.hasSuccessor = True
+
+        node = extendPaths(mergePaths(predecessors or [source]), len(qubits))
+
+        for q in qubits:
+            lastOnQubit[q] = node
+
+        if not qubits:
+            gatesWithoutQubits = node if gatesWithoutQubits is None else mergePaths([gatesWithoutQubits, node])
+
+    sinkPredecessors = list({ id(d): d for d in lastOnQubit.values() if not d.hasSuccessor }.values())
+    if gatesWithoutQubits is not None:
+        sinkPredecessors += [gatesWithoutQubits]
+
+    stats = mergePaths(sinkPredecessors or [source])
+    meanLengthOfPath, varianceLengthOfPath = exactMoments(stats.numberOfPaths, stats.sumOfLengthsOfPaths, stats.sumOfSquaredLengthsOfPaths)
+
+    return {
+        "NumberOfGatesInCriticalPath": stats.maxLengthOfPath,
+        "MaxNumberOfTwoQubitGatesInCriticalPath": stats.maxNumberOfTwoQubitGatesInPathsWithMaxLength,
+        "NumberOfCriticalPaths": stats.numberOfPathsWithMaxLength,
+        "NumberOfCriticalPathsWithMaxTwoQubitsGates": stats.numberOfPathsWithMaxLengthWithMaxNumberOfTwoQubitGates,
+        "PathLengthMean": meanLengthOfPath,
+        "PathLengthStandardDeviation": varianceLengthOfPath.sqrt(),
     }
 
 
@@ -173,7 +725,7 @@ qubits 3
   t q[1]
 """
 
-    output = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
 
     expected = {
         "NumberOfGatesInCriticalPath": 4,
@@ -183,7 +735,10 @@ qubits 3
         "PathLengthMean": Decimal(3.5),
         "PathLengthStandardDeviation": Decimal(0.5),
     }
-    checkSame(output, expected)
+
+    for exact, backend in ((False, "loop"), (True, "loop"), (True, "vectorized")):
+        checkSame(getPathStats(instructions, exact = exact, backend = backend), expected)
+    checkSame(getPathStatsStreaming(iter(instructions)), expected)
 
 def test2():
     cq = """
@@ -197,7 +752,7 @@ qubits 4
   cnot q[1], q[3]
 """
 
-    output = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
 
     expected = {
         "NumberOfGatesInCriticalPath": 3,
@@ -208,7 +763,9 @@ qubits 4
         "PathLengthStandardDeviation": Decimal(0),
     }
 
-    checkSame(output, expected)
+    for exact, backend in ((False, "loop"), (True, "loop"), (True, "vectorized")):
+        checkSame(getPathStats(instructions, exact = exact, backend = backend), expected)
+    checkSame(getPathStatsStreaming(iter(instructions)), expected)
 
 
 def test3():
@@ -223,7 +780,7 @@ qubits 4
   h q[1]
 """
 
-    output = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
 
     expected = {
         "NumberOfGatesInCriticalPath": 2,
@@ -234,7 +791,9 @@ qubits 4
         "PathLengthStandardDeviation": Decimal(0.5),
     }
 
-    checkSame(output, expected)
+    for exact, backend in ((False, "loop"), (True, "loop"), (True, "vectorized")):
+        checkSame(getPathStats(instructions, exact = exact, backend = backend), expected)
+    checkSame(getPathStatsStreaming(iter(instructions)), expected)
 
 
 def test4(): # This illustrates that computing the path statistics is difficult this way: this relatively small circuit already has 53000+ paths from source to sink.
@@ -311,9 +870,14 @@ qubits 3
   cnot q[2], q[0]
 """
 
-    result = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
+    result = getPathStats(instructions)
     # print(result)
 
+    checkSame(result, getPathStats(instructions, exact = True))
+    assert getPathStats(instructions, exact = True) == getPathStats(instructions, backend = "vectorized")
+    assert getPathStats(instructions, exact = True) == getPathStatsStreaming(iter(instructions))
+
 
 def test5():
     cq = """
@@ -330,7 +894,7 @@ qubits 3
   h q[0]
 """
 
-    output = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
 
     expected = {
         "NumberOfGatesInCriticalPath": 3,
@@ -341,7 +905,9 @@ qubits 3
         "PathLengthStandardDeviation": Decimal(0.4),
     }
 
-    checkSame(output, expected)
+    for exact, backend in ((False, "loop"), (True, "loop"), (True, "vectorized")):
+        checkSame(getPathStats(instructions, exact = exact, backend = backend), expected)
+    checkSame(getPathStatsStreaming(iter(instructions)), expected)
 
 def test6():
     cq = """
@@ -367,15 +933,174 @@ qubits 4
   h q[2]
 """
 
-    output = getPathStats(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+    instructions = CQASMParser.parseCQASMString(cq).subcircuits[0].instructions
+    output = getPathStats(instructions, exact = True)
 
     assert output["NumberOfGatesInCriticalPath"] == 7
+    assert criticalPathLength(buildDDG(instructions)) == 7
+    assert criticalPathLength(buildDDG([])) == 0
+    assert getPathStats(None, exact = True, ddg = buildDDG(instructions)) == output
     assert output["NumberOfCriticalPaths"] == 1
     assert output["NumberOfCriticalPathsWithMaxTwoQubitsGates"] == 1
     assert output["MaxNumberOfTwoQubitGatesInCriticalPath"] == 1
 
 
 
+def test7():
+    cq = """
+    version 1.0
+
+qubits 3
+
+.testCircuit
+  x q[2]
+  cnot q[0], q[2]
+  cnot q[0], q[2]
+  h q[1]
+"""
+
+    ddg = buildDDG(CQASMParser.parseCQASMString(cq).subcircuits[0].instructions)
+
+    assert ddg.offsets.tolist() == [0, 1, 2, 2, 2]
+    assert ddg.targets.tolist() == [1, 2]
+    assert ddg.sourceSuccessors.tolist() == [0, 3]
+
+    graph = ddg.toNetworkx()
+    assert graph.number_of_nodes() == 6
+    assert sorted((str(a), str(b)) for a, b in graph.edges()) == sorted([
+        ("SOURCE", str((0, ddg.instructions[0]))),
+        ("SOURCE", str((3, ddg.instructions[3]))),
+        (str((0, ddg.instructions[0])), str((1, ddg.instructions[1]))),
+        (str((1, ddg.instructions[1])), str((2, ddg.instructions[2]))),
+        (str((2, ddg.instructions[2])), "SINK"),
+        (str((3, ddg.instructions[3])), "SINK"),
+    ])
+
+def test8():
+    cq = """
+    version 1.0
+
+qubits 4
+
+.testCircuit
+  cnot q[0], q[3]
+  rx q[1], 0.5
+  cnot q[1], q[2]
+  measure_z q[0:3]
+  cnot q[1], q[3]
+  h q[0]
+"""
+
+    subcircuit = CQASMParser.parseCQASMString(cq).subcircuits[0]
+    compact = CompactSubcircuit.fromSubcircuit(subcircuit)
+
+    for backend in ("loop", "vectorized"):
+        assert getPathStats(compact, exact = True, backend = backend) == getPathStats(subcircuit.instructions, exact = True, backend = backend)
+
+def randomCircuit(rng: random.Random, singleQubitGates: tuple[str, ...] = ("h",), twoQubitGates: tuple[str, ...] = ("cnot",)) -> CQASMParser.Subcircuit:
+    # A small random circuit (1 to 4 qubits, 1 to 12 gates), whose paths can all be enumerated.
+    numberOfQubits = rng.randint(1, 4)
+    lines = [f"version 1.0\nqubits {numberOfQubits}\n.testCircuit"]
+    for _ in range(rng.randint(1, 12)):
+        qubits = rng.sample(range(numberOfQubits), min(numberOfQubits, rng.randint(1, 2)))
+        gates = twoQubitGates if len(qubits) == 2 else singleQubitGates
+        lines.append(f"  {rng.choice(gates)} " + ", ".join(f"q[{q}]" for q in qubits))
+    return CQASMParser.parseCQASMString("\n".join(lines) + "\n").subcircuits[0]
+
+def chainCircuit(n: int) -> list[CQASMParser.Instruction]:
+    # n times cnot q[0], q[1]; h q[0]; h q[1]: 2^n paths, all of 2n gates.
+    lines = ["version 1.0\nqubits 2\n.testCircuit"] + ["  cnot q[0], q[1]\n  h q[0]\n  h q[1]"] * n
+    return CQASMParser.parseCQASMString("\n".join(lines) + "\n").subcircuits[0].instructions
+
+def allPaths(ddg: DDG, node: int = None) -> list[list[int]]:
+    # All the paths from node (SOURCE by default) to SINK, as lists of gate indices, by enumeration.
+    node = len(ddg) + 1 if node is None else node
+    if node == len(ddg):
+        return [[]]
+    return [([node] if node < len(ddg) else []) + p for c in childrenOf(ddg, node) for p in allPaths(ddg, c)]
+
+def test9():
+    # Against all the paths, enumerated on small random circuits.
+    rng = random.Random(9)
+    for _ in range(100):
+        ddg = buildDDG(randomCircuit(rng).instructions)
+        nodesData = propagatePathData(ddg)
+        stats = getPathStats(None, exact = True, ddg = ddg)
+
+        paths = allPaths(ddg)
+        longest = max(len(p) for p in paths)
+        critical = [p for p in paths if len(p) == longest]
+        twoQubitGates = lambda p: sum(ddg.numberOfQubitOperands[g] == 2 for g in p)
+        mostTwoQubitGates = [p for p in critical if twoQubitGates(p) == stats["MaxNumberOfTwoQubitGatesInCriticalPath"]]
+
+        assert sorted(criticalPaths(ddg, len(paths), nodesData)) == sorted(critical) and len(critical) == stats["NumberOfCriticalPaths"]
+        assert sorted(criticalPaths(ddg, len(paths), nodesData, maxTwoQubitGates = True)) == sorted(mostTwoQubitGates)
+        assert len(mostTwoQubitGates) == stats["NumberOfCriticalPathsWithMaxTwoQubitsGates"]
+        assert len(list(criticalPaths(ddg, 1, nodesData))) == 1
+
+        assert all(p in paths for p in samplePaths(ddg, 10, nodesData, rng = rng))
+        assert all(p in critical for p in samplePaths(ddg, 10, nodesData, critical = True, rng = rng))
+
+    # Uniform: every one of the 2^20 paths of a chain of cnot/h pairs is as likely, so both halves of the first choice are drawn
+    # about as often, and a critical path is found at once among a million paths.
+    ddg = buildDDG(chainCircuit(20))
+    samples = samplePaths(ddg, 2000, rng = rng)
+    assert 900 < sum(p[1] == 1 for p in samples) < 1100
+    assert len(next(criticalPaths(ddg, 1))) == getPathStats(None, ddg = ddg)["NumberOfGatesInCriticalPath"]
+
+def test10():
+    # Against the lengths of all the paths, enumerated on small random circuits.
+    rng = random.Random(10)
+    for _ in range(100):
+        ddg = buildDDG(randomCircuit(rng).instructions)
+        lengths = sorted(len(p) for p in allPaths(ddg))
+
+        def expected(low, high):
+            return [sum(1 for l in lengths if l == length) for length in range(low, high + 1)]
+
+        h = pathLengthHistogram(ddg)
+        assert h.counts.tolist() == expected(lengths[0], lengths[-1]) and h.minLength == lengths[0]
+        for q in (0, 0.25, 0.5, 0.9, 1):
+            assert histogramQuantile(h, q) == lengths[max(math.ceil(Fraction(q) * len(lengths)), 1) - 1]
+
+        low = rng.randint(0, lengths[-1])
+        high = rng.randint(low, lengths[-1] + 1)
+        h = pathLengthHistogram(ddg, window = (low, high))
+        assert [0] * (h.minLength - low) + h.counts.tolist() + [0] * (high - h.minLength - len(h.counts) + 1) == expected(low, high)
+
+    # 2^70 paths of 140 gates: the counts switch to Python integers instead of wrapping around in int64.
+    h = pathLengthHistogram(buildDDG(chainCircuit(70)))
+    assert h.minLength == 140 and h.counts.tolist() == [2 ** 70] and histogramQuantile(h, 0.5) == 140
+    assert histogramQuantile(pathLengthHistogram(buildDDG([]), window = (1, 2)), 0.5) is None
+
+def test11():
+    import tempfile, os
+    model = DurationModel(durations = { "CNOT": 40, "measure": 300 }, defaultByArity = { 1: 20 }, default = 25)
+    rng = random.Random(11)
+    for _ in range(100):
+        subcircuit = randomCircuit(rng, singleQubitGates = ("h", "measure"), twoQubitGates = ("cnot", "cz"))
+        ddg = buildDDG(subcircuit.instructions)
+        durations = model.gateDurations(subcircuit.instructions)
+        expected = max(sum(durations[g] for g in p) for p in allPaths(ddg))
+
+        assert criticalPathDuration(ddg, durations) == expected
+        for exact, backend in ((False, "loop"), (True, "loop"), (True, "vectorized")):
+            stats = getPathStats(None, exact = exact, backend = backend, ddg = ddg, durations = model)
+            assert stats["CriticalPathDuration"] == expected
+            assert getPathStats(None, exact = exact, backend = backend, ddg = ddg, durations = DurationModel())["CriticalPathDuration"] == stats["NumberOfGatesInCriticalPath"]
+
+        compact = CompactSubcircuit.fromSubcircuit(subcircuit)
+        assert model.gateDurations(compact).tolist() == durations.tolist()
+
+    assert model.gateDurations([CQASMParser.Gate("cz", [CQASMParser.Qubit(0), CQASMParser.Qubit(1)]), CQASMParser.Gate("Measure", [CQASMParser.Qubit(0)])]).tolist() == [25., 300.]
+    assert "CriticalPathDuration" not in getPathStats([])
+    assert criticalPathDuration(buildDDG([]), np.zeros(0)) == 0.
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "durations.json"), "w") as f:
+            f.write(model.toJSON())
+        assert DurationModel.fromFile(os.path.join(directory, "durations.json")) == model
+
 
 if __name__ == "__main__":
     test1()
@@ -384,3 +1109,8 @@ if __name__ == "__main__":
     test4()
     test5()
     test6()
+    test7()
+    test8()
+    test9()
+    test10()
+    test11()
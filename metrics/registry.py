@@ -0,0 +1,209 @@
+###################
+# Registry of the metrics that the batch runner (processFiles.py) computes for each subcircuit, or for each whole program.
+# A metric is a function returning { column: value }, which declares what it needs among these intermediate structures:
+#   "instructions"  the gates of the subcircuit (list of instructions, or CompactSubcircuit)
+#   "codes"         the instructions interned as integers (Subcircuit.codes, see longestRepeatingSubcircuit)
+#   "ddg"           the data dependency graph (paths.buildDDG)
+#   "summary"       the paths of the DDG between the qubits in and out of the subcircuit (summaries.summarizeDDG)
+#   "iterations"    the number of iterations of the subcircuit
+#   "durationModel" the durations of the gates (paths.DurationModel), a setting of the run given by the caller in built
+# They are built on demand, once per subcircuit, and shared by the metrics that need them (see computeMetrics).
+# A metric of scope "program" is given the list of its intermediates for all the subcircuits, in order (see computeProgramMetrics):
+# only those are kept from one subcircuit to the next, so they should be small (a summary, not a DDG).
+# The version of a metric must be bumped whenever its results change, so that cached results (see cache.py) are not reused;
+# the columns are typed as described in outputs.py. Several metrics may give the same column, with the same value.
+###################
+
+import typing
+from dataclasses import dataclass
+from fractions import Fraction
+from parsing.CompactSubcircuit import CompactSubcircuit
+from metrics.longestRepeatingSubcircuit import longestRepeatingSubcircuit, internInstructions
+from metrics.paths import buildDDG, getPathStats, criticalPathLength, criticalPathDuration, DurationModel, pathLengthHistogram, histogramQuantile
+from metrics.summaries import summarizeDDG, composeProgram, pathStatistics
+
+@dataclass
+class Metric:
+    name: str
+    function: typing.Callable[..., dict]
+    needs: tuple[str, ...]
+    version: int
+    columns: dict[str, str]
+    scope: str = "subcircuit" # or "program"
+
+METRICS: dict[str, Metric] = {}
+
+def register(name: str, needs: tuple[str, ...], version: int, columns: dict[str, str], scope: str = "subcircuit"):
+    def decorator(function):
+        assert name not in METRICS, f"metric {name} registered twice"
+        assert all(need in INTERMEDIATES for need in needs), f"metric {name} needs unknown intermediates"
+        assert scope in ("subcircuit", "program"), f"metric {name} has unknown scope {scope}"
+        METRICS[name] = Metric(name = name, function = function, needs = needs, version = version, columns = columns, scope = scope)
+        return function
+    return decorator
+
+def instructionsOf(subcircuit):
+    return subcircuit if isinstance(subcircuit, CompactSubcircuit) else subcircuit.instructions
+
+# How to build each intermediate structure, from the subcircuit and the intermediates built so far.
+INTERMEDIATES = {
+    "instructions": lambda subcircuit, built: instructionsOf(subcircuit),
+    "codes": lambda subcircuit, built: subcircuit.codes if subcircuit.codes is not None else internInstructions(intermediate("instructions", subcircuit, built)),
+    "ddg": lambda subcircuit, built: buildDDG(intermediate("instructions", subcircuit, built)),
+    "summary": lambda subcircuit, built: summarizeDDG(intermediate("ddg", subcircuit, built)),
+    "iterations": lambda subcircuit, built: subcircuit.iterations,
+    "durationModel": lambda subcircuit, built: DurationModel(), # 1 per gate, when the caller gives no model
+}
+
+def intermediate(need: str, subcircuit, built: dict):
+    if need not in built:
+        built[need] = INTERMEDIATES[need](subcircuit, built)
+    return built[need]
+
+def computeMetrics(subcircuit, metrics: typing.Iterable[str], built: dict = None) -> dict:
+    # The columns of the given metrics (of scope "subcircuit") for a Subcircuit or a CompactSubcircuit.
+    # built, if given, receives the intermediates, e.g. to keep those needed by program metrics.
+    built = {} if built is None else built
+    row = {}
+    for name in metrics:
+        metric = METRICS[name]
+        assert metric.scope == "subcircuit", f"{name} is not a subcircuit metric"
+        row.update(metric.function(**{ need: intermediate(need, subcircuit, built) for need in metric.needs }))
+    return row
+
+def programNeeds(metrics: typing.Iterable[str]) -> set[str]:
+    # The intermediates to keep from each subcircuit for the given program metrics.
+    return { need for name in metrics for need in METRICS[name].needs }
+
+def computeProgramMetrics(metrics: typing.Iterable[str], kept: list[dict]) -> dict:
+    # The columns of the given metrics (of scope "program"), from the programNeeds intermediates kept for each subcircuit.
+    row = {}
+    for name in metrics:
+        metric = METRICS[name]
+        assert metric.scope == "program", f"{name} is not a program metric"
+        row.update(metric.function(**{ need: [built[need] for built in kept] for need in metric.needs }))
+    return row
+
+def columnsOf(metrics: typing.Iterable[str]) -> dict[str, str]:
+    columns = {}
+    for name in metrics:
+        columns.update(METRICS[name].columns)
+    return columns
+
+
+@register("longestRepeatingSubcircuit", needs = ("instructions", "codes"), version = 1, columns = {
+    "LengthOfLongestRepeatingSubcircuit": "int",
+    "NumberOfRepetitionsOfLongestRepeatingSubcircuit": "int",
+})
+def longestRepeatingSubcircuitMetric(instructions, codes):
+    stats = longestRepeatingSubcircuit(instructions, codes = codes)
+    return {
+        "LengthOfLongestRepeatingSubcircuit": len(stats["LongestRepeatingSubcircuit"]),
+        "NumberOfRepetitionsOfLongestRepeatingSubcircuit": stats["NumberOfRepetitionsOfLongestRepeatingSubcircuit"],
+    }
+
+@register("pathStats", needs = ("ddg",), version = 2, columns = {
+    "NumberOfGatesInCriticalPath": "int",
+    "MaxNumberOfTwoQubitGatesInCriticalPath": "int",
+    "NumberOfCriticalPaths": "integer",
+    "NumberOfCriticalPathsWithMaxTwoQubitsGates": "integer",
+    "PathLengthMean": "float",
+    "PathLengthStandardDeviation": "float",
+})
+def pathStatsMetric(ddg):
+    # Exact moments (version 2): faster than the Decimal mean and variance at every node (version 1), and without their rounding.
+    return getPathStats(None, exact = True, ddg = ddg)
+
+@register("criticalPathLength", needs = ("ddg",), version = 1, columns = {
+    "NumberOfGatesInCriticalPath": "int",
+})
+def criticalPathLengthMetric(ddg):
+    # Much cheaper than pathStats, which also counts the paths.
+    return { "NumberOfGatesInCriticalPath": criticalPathLength(ddg) }
+
+@register("criticalPathDuration", needs = ("ddg", "durationModel"), version = 1, columns = {
+    "CriticalPathDuration": "float",
+})
+def criticalPathDurationMetric(ddg, durationModel):
+    # The length of an ASAP schedule with the durations of the model, as cheap as criticalPathLength.
+    return { "CriticalPathDuration": criticalPathDuration(ddg, durationModel.gateDurations(ddg.instructions)) }
+
+@register("pathLengthQuantiles", needs = ("ddg",), version = 1, columns = {
+    "PathLengthMin": "int",
+    "PathLengthQuartile1": "int",
+    "PathLengthMedian": "int",
+    "PathLengthQuartile3": "int",
+})
+def pathLengthQuantilesMetric(ddg):
+    # Exact, from the histogram of the lengths of all the paths (costs nodes x depth, a few times pathStats).
+    h = pathLengthHistogram(ddg)
+    return {
+        "PathLengthMin": histogramQuantile(h, 0),
+        "PathLengthQuartile1": histogramQuantile(h, Fraction(1, 4)),
+        "PathLengthMedian": histogramQuantile(h, Fraction(1, 2)),
+        "PathLengthQuartile3": histogramQuantile(h, Fraction(3, 4)),
+    }
+
+@register("programPathStats", needs = ("summary", "iterations"), version = 1, scope = "program", columns = {
+    "NumberOfGatesInCriticalPath": "int",
+    "MaxNumberOfTwoQubitGatesInCriticalPath": "int",
+    "NumberOfCriticalPaths": "integer",
+    "NumberOfCriticalPathsWithMaxTwoQubitsGates": "integer",
+    "PathLengthMean": "float",
+    "PathLengthStandardDeviation": "float",
+    "NumberOfGates": "integer",
+    "NumberOfTwoQubitGates": "integer",
+})
+def programPathStatsMetric(summary, iterations):
+    # pathStats of the whole program, subcircuits and their iterations included, from the summaries of the subcircuits.
+    return pathStatistics(composeProgram(summary, iterations))
+
+
+def test1():
+    from parsing import CQASMParser
+    cq = """
+version 1.0
+qubits 3
+.testCircuit
+  h q[0]
+  cnot q[0], q[1]
+  h q[0]
+  cnot q[0], q[1]
+  h q[2]
+"""
+    subcircuit = CQASMParser.parseCQASMString(cq).subcircuits[0]
+
+    assert computeMetrics(subcircuit, ["pathLengthQuantiles"]) == { "PathLengthMin": 1, "PathLengthQuartile1": 1, "PathLengthMedian": 3, "PathLengthQuartile3": 4 }
+
+    assert computeMetrics(subcircuit, ["criticalPathDuration"]) == { "CriticalPathDuration": 4. }
+    assert computeMetrics(subcircuit, ["criticalPathDuration"], { "durationModel": DurationModel(durations = { "cnot": 40 }, default = 20) }) == { "CriticalPathDuration": 120. }
+
+    row = computeMetrics(subcircuit, ["longestRepeatingSubcircuit", "criticalPathLength"])
+    assert row == { "LengthOfLongestRepeatingSubcircuit": 2, "NumberOfRepetitionsOfLongestRepeatingSubcircuit": 2, "NumberOfGatesInCriticalPath": 4 }
+    assert set(row) == set(columnsOf(["longestRepeatingSubcircuit", "criticalPathLength"]))
+
+    # The DDG is built once for both metrics.
+    built = {}
+    ddg = intermediate("ddg", subcircuit, built)
+    assert intermediate("ddg", subcircuit, built) is ddg and set(built) == { "instructions", "ddg" }
+
+    # Same results from the compact representation, which has no codes.
+    compact = CompactSubcircuit.fromInstructions(subcircuit.name, subcircuit.iterations, subcircuit.instructions)
+    subcircuitMetrics = [name for name, metric in METRICS.items() if metric.scope == "subcircuit"]
+    assert computeMetrics(compact, subcircuitMetrics) == computeMetrics(subcircuit, subcircuitMetrics)
+
+    # The program metrics only see what is kept of each subcircuit.
+    from metrics.summaries import getProgramPathStats
+    subcircuits = CQASMParser.parseCQASMString(cq + ".loop(1000)\n  cnot q[1], q[2]\n  h q[1]\n").subcircuits
+    kept = []
+    for s in subcircuits:
+        built = {}
+        computeMetrics(s, ["pathStats"], built)
+        kept.append({ need: intermediate(need, s, built) for need in programNeeds(["programPathStats"]) })
+    row = computeProgramMetrics(["programPathStats"], kept)
+    assert row == getProgramPathStats(subcircuits) and set(row) == set(columnsOf(["programPathStats"]))
+    assert row["NumberOfGatesInCriticalPath"] == 4 + 2 * 1000 and row["NumberOfGates"] == 5 + 2 * 1000
+
+
+if __name__ == "__main__":
+    test1()
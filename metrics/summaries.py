@@ -0,0 +1,322 @@
+###################
+# Path statistics of whole programs, including subcircuit iterations, without unrolling them.
+# A sequence of gates is summarized by the paths of its DDG between its "ports":
+#   in ports    the gates that are the first of the sequence on some qubits (their predecessors are before the sequence)
+#   out ports   the gates that are the last of the sequence on some qubits (their successors are after the sequence)
+# Every port has at most one per qubit, so a summary is a (sparse) matrix of at most qubits x qubits entries, whatever the
+# number of gates. Entry [i][o] aggregates the paths from in port i to out port o (both included) as an element of a semiring:
+#   (N, S1, S2, L, NL, T, NT) = number of paths, sum of their lengths, sum of their squared lengths, max length,
+#                               number of paths with max length, max number of two-qubit gates among those, number of those
+# where lengths are numbers of gates. add() is for the union of disjoint sets of paths, mul() for their concatenation.
+# Summaries of consecutive sequences compose (compose(a, b) summarizes a then b), so that the summary of a subcircuit
+# iterated n times is obtained with O(log n) compositions (power), and the whole program with one composition per subcircuit.
+# The statistics of all paths from SOURCE to SINK are then read from the ports without predecessor or successor at all
+# (pathStatistics); they are the same as getPathStats(exact=True) on the unrolled program.
+# Gates without qubit operand have no predecessor nor successor: they are paths of their own, only accumulated in isolated.
+###################
+
+import typing
+from dataclasses import dataclass, field
+from parsing import CQASMParser
+from metrics.paths import DDG, gateQubits, exactMoments
+
+ONE = (1, 0, 0, 0, 1, 0, 1) # the empty path; "zero" (no path) is None
+
+def add(x, y):
+    if x is None:
+        return y
+    if y is None:
+        return x
+
+    N, S1, S2, L, NL, T, NT = x
+    N_, S1_, S2_, L_, NL_, T_, NT_ = y
+    if L_ > L or (L_ == L and T_ > T):
+        L, NL, T, NT, L_, NL_, T_, NT_ = L_, NL_, T_, NT_, L, NL, T, NT
+    if L_ == L:
+        NL += NL_
+        if T_ == T:
+            NT += NT_
+    return (N + N_, S1 + S1_, S2 + S2_, L, NL, T, NT)
+
+def mul(x, y):
+    if x is None or y is None:
+        return None
+
+    N, S1, S2, L, NL, T, NT = x
+    N_, S1_, S2_, L_, NL_, T_, NT_ = y
+    return (N * N_, S1 * N_ + N * S1_, S2 * N_ + 2 * S1 * S1_ + N * S2_, L + L_, NL * NL_, T + T_, NT * NT_)
+
+def gateElement(numberOfQubitOperands: int):
+    assert numberOfQubitOperands <= 2, "contains a 3+ qubits gate"
+    return (1, 1, 1, 1, 1, int(numberOfQubitOperands == 2), 1)
+
+@dataclass
+class Port:
+    qubits: frozenset # the qubits on which the gate is the first (in port) or the last (out port)
+    gateQubits: frozenset # all the qubits of the gate
+
+@dataclass
+class Summary:
+    qubits: frozenset = frozenset()
+    inPorts: list[Port] = field(default_factory = list)
+    outPorts: list[Port] = field(default_factory = list)
+    paths: dict[int, dict[int, tuple]] = field(default_factory = dict) # in port -> out port -> element
+    isolated: tuple = None
+    numberOfGates: int = 0
+    numberOfTwoQubitGates: int = 0
+
+def summarizeGates(c) -> Summary:
+    # One pass over the gates (list of instructions or CompactSubcircuit), keeping the paths from the in ports to the gates
+    # that are still the last on some qubit.
+    inPorts = []
+    isolated = None
+    numberOfGates = 0
+    numberOfTwoQubitGates = 0
+    lastOnQubit = {}
+    pathsTo = {} # gate -> in port -> element, for the gates in lastOnQubit
+    qubitsOf = {}
+
+    for g, qubits in enumerate(gateQubits(c)):
+        element = gateElement(len(qubits))
+        numberOfGates += 1
+        numberOfTwoQubitGates += len(qubits) == 2
+
+        if not qubits:
+            isolated = add(isolated, element)
+            continue
+
+        predecessors = { lastOnQubit[q] for q in qubits if q in lastOnQubit }
+        paths = {}
+        for p in predecessors:
+            for i, x in pathsTo[p].items():
+                paths[i] = add(paths.get(i), x)
+        paths = { i: mul(x, element) for i, x in paths.items() }
+
+        first = frozenset(q for q in qubits if q not in lastOnQubit)
+        if first:
+            inPorts.append(Port(qubits = first, gateQubits = frozenset(qubits)))
+            paths[len(inPorts) - 1] = element
+
+        for q in qubits:
+            lastOnQubit[q] = g
+        pathsTo[g] = paths
+        qubitsOf[g] = frozenset(qubits)
+        for p in predecessors:
+            if p not in lastOnQubit.values():
+                del pathsTo[p]
+
+    outPorts = []
+    summaryPaths = {}
+    for g in sorted(pathsTo):
+        o = len(outPorts)
+        outPorts.append(Port(qubits = frozenset(q for q in qubitsOf[g] if lastOnQubit[q] == g), gateQubits = qubitsOf[g]))
+        for i, x in pathsTo[g].items():
+            summaryPaths.setdefault(i, {})[o] = x
+
+    return Summary(qubits = frozenset(lastOnQubit), inPorts = inPorts, outPorts = outPorts, paths = summaryPaths, isolated = isolated,
+                   numberOfGates = numberOfGates, numberOfTwoQubitGates = numberOfTwoQubitGates)
+
+def summarizeDDG(ddg: DDG) -> Summary:
+    # Same as summarizeGates(ddg.instructions), following the edges of an already built DDG instead of finding the
+    # predecessors again. The paths from the in ports are pushed forward along the edges, and dropped once consumed.
+    qubits = list(gateQubits(ddg.instructions))
+    offsets = ddg.offsets.tolist()
+    targets = ddg.targets.tolist()
+
+    firstOnQubit = {}
+    lastOnQubit = {}
+    for g, gateQubitList in enumerate(qubits):
+        for q in gateQubitList:
+            firstOnQubit.setdefault(q, g)
+            lastOnQubit[q] = g
+
+    inPorts = []
+    inPortOf = {}
+    for g in sorted(set(firstOnQubit.values())):
+        inPortOf[g] = len(inPorts)
+        inPorts.append(Port(qubits = frozenset(q for q in qubits[g] if firstOnQubit[q] == g), gateQubits = frozenset(qubits[g])))
+
+    outPorts = []
+    outPortOf = {}
+    for g in sorted(set(lastOnQubit.values())):
+        outPortOf[g] = len(outPorts)
+        outPorts.append(Port(qubits = frozenset(q for q in qubits[g] if lastOnQubit[q] == g), gateQubits = frozenset(qubits[g])))
+
+    isolated = None
+    summaryPaths = {}
+    incoming = {} # gate -> in port -> element, the paths from the in ports to the predecessors of the gate
+    for g in range(len(ddg)):
+        element = gateElement(len(qubits[g]))
+        if not qubits[g]:
+            isolated = add(isolated, element)
+            continue
+
+        paths = { i: mul(x, element) for i, x in incoming.pop(g, {}).items() }
+        if g in inPortOf:
+            paths[inPortOf[g]] = element
+
+        for s in targets[offsets[g]:offsets[g + 1]]:
+            pathsToS = incoming.setdefault(s, {})
+            for i, x in paths.items():
+                pathsToS[i] = add(pathsToS.get(i), x)
+
+        if g in outPortOf:
+            for i, x in paths.items():
+                summaryPaths.setdefault(i, {})[outPortOf[g]] = x
+
+    return Summary(qubits = frozenset(lastOnQubit), inPorts = inPorts, outPorts = outPorts, paths = summaryPaths, isolated = isolated,
+                   numberOfGates = len(ddg), numberOfTwoQubitGates = int((ddg.numberOfQubitOperands == 2).sum()))
+
+def compose(a: Summary, b: Summary) -> Summary:
+    # The summary of the gates of a followed by those of b.
+    # Out port x of a is linked to in port y of b (one DDG edge) when x is the last gate of a on a qubit where y is the first of b.
+    # The ports of b (of a) on the qubits that a (b) does not use stay ports of the composition.
+    inPorts = list(a.inPorts)
+    inPortOfB = {}
+    for j, port in enumerate(b.inPorts):
+        qubits = port.qubits - a.qubits
+        if qubits:
+            inPortOfB[j] = len(inPorts)
+            inPorts.append(Port(qubits = qubits, gateQubits = port.gateQubits))
+
+    outPorts = []
+    outPortOfA = {}
+    for j, port in enumerate(a.outPorts):
+        qubits = port.qubits - b.qubits
+        if qubits:
+            outPortOfA[j] = len(outPorts)
+            outPorts.append(Port(qubits = qubits, gateQubits = port.gateQubits))
+    outPortOfB = { j: len(outPorts) + j for j in range(len(b.outPorts)) }
+    outPorts += b.outPorts
+
+    firstOnQubitOfB = { q: j for j, port in enumerate(b.inPorts) for q in port.qubits }
+    links = { x: { firstOnQubitOfB[q] for q in port.qubits if q in firstOnQubitOfB } for x, port in enumerate(a.outPorts) }
+
+    paths = {}
+    for i, row in a.paths.items():
+        newRow = {}
+        # Paths through b: the paths of a to its out ports, followed by the paths of b from the linked in ports.
+        entering = {}
+        for x, element in row.items():
+            if x in outPortOfA:
+                newRow[outPortOfA[x]] = element
+            for y in links[x]:
+                entering[y] = add(entering.get(y), element)
+        for y, element in entering.items():
+            for o, element_ in b.paths.get(y, {}).items():
+                newRow[outPortOfB[o]] = add(newRow.get(outPortOfB[o]), mul(element, element_))
+        if newRow:
+            paths[i] = newRow
+
+    for j, i in inPortOfB.items():
+        if j in b.paths:
+            paths[i] = { outPortOfB[o]: element for o, element in b.paths[j].items() }
+
+    return Summary(qubits = a.qubits | b.qubits, inPorts = inPorts, outPorts = outPorts, paths = paths, isolated = add(a.isolated, b.isolated),
+                   numberOfGates = a.numberOfGates + b.numberOfGates, numberOfTwoQubitGates = a.numberOfTwoQubitGates + b.numberOfTwoQubitGates)
+
+def power(s: Summary, n: int) -> Summary:
+    # The summary of the gates of s repeated n times, by squaring.
+    assert n >= 0
+    result = Summary()
+    while n > 0:
+        if n & 1:
+            result = compose(result, s)
+        n >>= 1
+        if n > 0:
+            s = compose(s, s)
+    return result
+
+def pathStatistics(s: Summary) -> dict:
+    # Same keys and values as getPathStats(exact=True), for the whole program summarized by s,
+    # plus its numbers of gates and of two-qubit gates.
+    paths = s.isolated
+    for i, row in s.paths.items():
+        if s.inPorts[i].qubits == s.inPorts[i].gateQubits: # no predecessor: linked to SOURCE
+            for o, element in row.items():
+                if s.outPorts[o].qubits == s.outPorts[o].gateQubits: # no successor: linked to SINK
+                    paths = add(paths, element)
+
+    N, S1, S2, L, NL, T, NT = ONE if paths is None else paths
+    mean, variance = exactMoments(N, S1, S2)
+    return {
+        "NumberOfGatesInCriticalPath": L,
+        "MaxNumberOfTwoQubitGatesInCriticalPath": T,
+        "NumberOfCriticalPaths": NL,
+        "NumberOfCriticalPathsWithMaxTwoQubitsGates": NT,
+        "PathLengthMean": mean,
+        "PathLengthStandardDeviation": variance.sqrt(),
+        "NumberOfGates": s.numberOfGates,
+        "NumberOfTwoQubitGates": s.numberOfTwoQubitGates,
+    }
+
+def composeProgram(summaries: typing.Iterable[Summary], iterations: typing.Iterable[int]) -> Summary:
+    # The summarized subcircuits one after the other, each repeated its number of iterations.
+    result = Summary()
+    for summary, n in zip(summaries, iterations):
+        result = compose(result, power(summary, n))
+    return result
+
+def summarizeProgram(subcircuits: list) -> Summary:
+    # The subcircuits (Subcircuit or CompactSubcircuit) one after the other, each repeated its number of iterations.
+    summaries = (summarizeGates(s.instructions if isinstance(s, CQASMParser.Subcircuit) else s) for s in subcircuits)
+    return composeProgram(summaries, (s.iterations for s in subcircuits))
+
+def getProgramPathStats(subcircuits: typing.Iterable) -> dict:
+    return pathStatistics(summarizeProgram(subcircuits))
+
+
+def test1():
+    # Against getPathStats on the unrolled program, for random programs.
+    import random
+    from metrics.paths import getPathStats, buildDDG
+
+    random.seed(1)
+    for _ in range(200):
+        numberOfQubits = random.randint(1, 5)
+
+        def randomGate():
+            arity = random.choice([0, 1, 1, 2, 2])
+            if arity > numberOfQubits:
+                arity = numberOfQubits
+            qubits = random.sample(range(numberOfQubits), arity)
+            return CQASMParser.Gate(name = ["x", "cnot"][arity == 2] if arity else "measure_all", operands = [CQASMParser.Qubit(q) for q in qubits])
+
+        subcircuits = [CQASMParser.Subcircuit(name = f"s{k}", iterations = random.randint(1, 4), instructions = [randomGate() for _ in range(random.randint(0, 8))])
+                       for k in range(random.randint(1, 3))]
+        unrolled = [g for s in subcircuits for _ in range(s.iterations) for g in s.instructions]
+
+        expected = getPathStats(unrolled, exact = True)
+        stats = getProgramPathStats(subcircuits)
+        assert { k: stats[k] for k in expected } == expected, (subcircuits, stats, expected)
+
+        summaries = [summarizeDDG(buildDDG(s.instructions)) for s in subcircuits]
+        assert summaries == [summarizeGates(s.instructions) for s in subcircuits]
+        assert pathStatistics(composeProgram(summaries, [s.iterations for s in subcircuits])) == stats
+        assert stats["NumberOfGates"] == len(unrolled)
+        assert stats["NumberOfTwoQubitGates"] == sum(len(g.operands) == 2 for g in unrolled)
+
+def test2():
+    # A million iterations, which could not be unrolled.
+    cq = """
+version 1.0
+qubits 2
+.init
+  h q[0]
+.loop(1000000)
+  cnot q[0], q[1]
+  h q[0]
+  h q[1]
+"""
+    stats = getProgramPathStats(CQASMParser.parseCQASMString(cq).subcircuits)
+
+    # The critical path goes through cnot and one of the h of every iteration: 2^1000000 critical paths.
+    assert stats["NumberOfGatesInCriticalPath"] == 1 + 2 * 1000000
+    assert stats["MaxNumberOfTwoQubitGatesInCriticalPath"] == 1000000
+    assert stats["NumberOfCriticalPaths"] == 2 ** 1000000
+    assert stats["NumberOfGates"] == 1 + 3 * 1000000
+
+
+if __name__ == "__main__":
+    test1()
+    test2()
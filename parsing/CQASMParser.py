@@ -5,10 +5,13 @@
 # which is a rewrite of Flex (lexer generator) and Bison (parser generator) completely in Python.
 # This way to parse is therefore quite inefficient, but completely fine
 # for prototyping and testing new things on smaller circuits.
+# The lexer and parser are built on first use (see getParser), from the tables shipped in lextab.py and parsetab.py,
+# so importing this module is cheap. After changing the token rules, delete lextab.py so that it is regenerated.
 ###################
 
 
-import typing
+import copy, os, sys, threading
+from array import array
 
 ################### Lexing
 # omitted: JSON literals, string literals, control flow (for, ifelse,...), a lot of operators, BUNDLES
@@ -34,12 +37,12 @@ tokens = ['NEWLINE', 'VERSION', 'INT_LITERAL', 'IDENTIFIER', 'FLOAT_LITERAL', 'Q
 
 def t_VERSION(t):
     r'version[ \t]+(?P<versionNumber>[0-9]+(\.[0-9]+(\.[0-9]+)?)?)'
-    t.value = lexer.lexmatch.group('versionNumber')
+    t.value = t.lexer.lexmatch.group('versionNumber')
     return t
 
 def t_QUBITS(t):
     r'qubits[ \t]+(?P<numberOfQubits>[0-9]+)'
-    t.value = int(lexer.lexmatch.group('numberOfQubits'))
+    t.value = int(t.lexer.lexmatch.group('numberOfQubits'))
     return t
 
 def t_IDENTIFIER(t):
@@ -73,9 +76,6 @@ def t_ignore_comment(t):
 def t_error(t):
     raise Exception("Illegal character '%s'" % t.value[0])
 
-import ply.lex as lex
-lexer = lex.lex(debug=debug)
-
 precedence = (
     # ('left', ':'),
     # ('left', ',', '['),
@@ -83,122 +83,259 @@ precedence = (
 
 ############ Definition of the abstract syntax tree
 
-class Instruction:
-    pass 
+class Node:
+    # Base of the AST node classes: nodes are immutable values, with __slots__ instead of a __dict__,
+    # and a structural hash computed once at construction.
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __hash__(self):
+        return self._hash
+
+class Instruction(Node):
+    __slots__ = ()
 
-class Subcircuit:
-    def __init__(self, name: str, instructions: list[Instruction], iterations: int):
-        self.name = name
-        self.instructions = instructions
-        self.iterations = iterations
+class Subcircuit(Node):
+    __slots__ = ("name", "instructions", "iterations", "codes", "_hash")
+
+    def __init__(self, name: str, instructions: list[Instruction], iterations: int, codes: array = None):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "instructions", tuple(instructions))
+        object.__setattr__(self, "iterations", iterations)
+        object.__setattr__(self, "codes", codes) # array('i') of InstructionTable codes, one per instruction
+        object.__setattr__(self, "_hash", None)
     
     def __repr__(self) -> str:
         return f".{self.name}\n" + "\n".join(map(repr, self.instructions))
 
-class Operand:
-    pass
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is type(self):
+            return self.name == other.name and self.iterations == other.iterations and self.instructions == other.instructions
+        return False
+
+    def __hash__(self):
+        # Computed on first use only: hashing all the instructions is linear in the size of the subcircuit.
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((self.name, self.iterations, self.instructions)))
+        return self._hash
+
+    def __reduce__(self):
+        return (Subcircuit, (self.name, self.instructions, self.iterations, self.codes))
+
+class Operand(Node):
+    __slots__ = ()
 
 class Literal(Operand):
+    __slots__ = ("value", "_hash")
+
     def __init__(self, value):
-        self.value = value # Duck-typing allows int, float, or ...
+        object.__setattr__(self, "value", value) # Duck-typing allows int, float, or ...
+        object.__setattr__(self, "_hash", hash((Literal, type(value), value)))
     
     def __repr__(self) -> str:
         return f"{self.value}"
         
     def __eq__(self, other):
-        if type(other) is type(self):
+        if self is other:
+            return True
+        if type(other) is type(self) and self._hash == other._hash:
             if (type(other.value) is type(self.value)):
                 return self.value == other.value
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Literal, (self.value,))
+
 class Variable(Operand):
+    __slots__ = ("name", "_hash")
+
     def __init__(self, name: str):
-        self.name = name
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "_hash", hash((Variable, name)))
     
     def __repr__(self) -> str:
         return f"{self.name}"
         
     def __eq__(self, other):
-        if type(other) is type(self):
+        if self is other:
+            return True
+        if type(other) is type(self) and self._hash == other._hash:
             if (type(other.name) is type(self.name)):
                 return self.name == other.name
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Variable, (self.name,))
+
 class Qubit(Operand):
-    def __init__(self, index: int):
+    __slots__ = ("index", "_hash")
+
+    def __new__(cls, index: int):
+        # Qubits with a small index are interned: Qubit(3) is always the same object.
+        if 0 <= index < len(smallQubits):
+            return smallQubits[index]
+
+        return Qubit.create(index)
+
+    @staticmethod
+    def create(index: int):
         assert index >= 0
-        self.index = index
+        self = object.__new__(Qubit)
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "_hash", hash((Qubit, index)))
+        return self
     
     def __repr__(self) -> str:
         return f"q[{self.index}]"
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(other) is type(self):
             return self.index == other.index
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Qubit, (self.index,))
+
+smallQubits = [Qubit.create(index) for index in range(1024)]
+
 class Qubits(Operand):
+    __slots__ = ("startQubit", "endQubit", "_hash")
+
     def __init__(self, startQubit: Qubit, endQubit: Qubit):
-        self.startQubit = startQubit
-        self.endQubit = endQubit
+        object.__setattr__(self, "startQubit", startQubit)
+        object.__setattr__(self, "endQubit", endQubit)
+        object.__setattr__(self, "_hash", hash((Qubits, startQubit, endQubit)))
     
     def __repr__(self) -> str:
         return f"q[{self.startQubit}:{self.endQubit}]"
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(other) is type(self):
             return self.startQubit == other.startQubit and self.endQubit == other.endQubit
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Qubits, (self.startQubit, self.endQubit))
+
 class ClassicalBit(Operand):
+    __slots__ = ("index", "_hash")
+
     def __init__(self, index: int):
         assert index >= 0
-        self.index = index
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "_hash", hash((ClassicalBit, index)))
     
     def __repr__(self) -> str:
         return f"b[{self.index}]"
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if type(other) is type(self):
             return self.index == other.index
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (ClassicalBit, (self.index,))
+
 class Gate(Instruction):
-    def __init__(self, name: str, operands: list[Operand], controlBits: list[ClassicalBit] = []):
-        self.name = name
-        self.operands = operands
-        self.controlBits = controlBits
+    __slots__ = ("name", "operands", "controlBits", "_hash")
+
+    def __init__(self, name: str, operands: list[Operand], controlBits: list[ClassicalBit] = ()):
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "operands", tuple(operands))
+        object.__setattr__(self, "controlBits", tuple(controlBits))
+        object.__setattr__(self, "_hash", hash((Gate, name, self.operands, self.controlBits)))
     
     def __repr__(self) -> str:
         cond = "cond(" + ", ".join(map(repr, self.controlBits)) + ") " if self.controlBits else " "
         return self.name + cond + ", ".join(map(repr, self.operands))
     
     def __eq__(self, other):
-        if type(other) is type(self):
+        if self is other:
+            return True
+        if type(other) is type(self) and self._hash == other._hash:
             return self.name == other.name and self.operands == other.operands and self.controlBits == other.controlBits
         return False
     
-    def __hash__(self):
-        return hash(str(self))    
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Gate, (self.name, self.operands, self.controlBits))
 
 class Mapping(Instruction):
+    __slots__ = ("variable", "targetQubit", "_hash")
+
     def __init__(self, variable: Variable, targetQubit: Qubit):
-        self.variable = variable
-        self.targetQubit = targetQubit
+        object.__setattr__(self, "variable", variable)
+        object.__setattr__(self, "targetQubit", targetQubit)
+        object.__setattr__(self, "_hash", hash((Mapping, variable, targetQubit)))
     
     def __repr__(self) -> str:
         return f"map {self.targetQubit}, {self.variable}"
     
     def __eq__(self, other):
-        if type(other) is type(self):
+        if self is other:
+            return True
+        if type(other) is type(self) and self._hash == other._hash:
             return self.variable == other.variable and self.targetQubit == other.targetQubit
         return False
 
+    __hash__ = Node.__hash__
+
+    def __reduce__(self):
+        return (Mapping, (self.variable, self.targetQubit))
+
+class InstructionTable:
+    # Interns instructions: every distinct instruction (compared structurally) gets a compact int code.
+    def __init__(self):
+        self.codes = {}
+        self.instructions = []
+
+    def intern(self, instruction: Instruction) -> int:
+        code = self.codes.get(instruction)
+        if code is None:
+            code = len(self.instructions)
+            self.codes[instruction] = code
+            self.instructions += [instruction]
+        return code
+
+    def internAll(self, instructions: list[Instruction]) -> array:
+        return array('i', map(self.intern, instructions))
+
+    def __getitem__(self, code: int) -> Instruction:
+        return self.instructions[code]
+
+    def __len__(self) -> int:
+        return len(self.instructions)
+
 class QuantumCircuit:
-    def __init__(self, version: str, qubits: int, subcircuits: list[Subcircuit]):
+    def __init__(self, version: str, qubits: int, subcircuits: list[Subcircuit], instructionTable: InstructionTable = None):
         self.version = version
         self.qubits = qubits
         self.subcircuits = subcircuits
+        self.instructionTable = instructionTable # codes of all subcircuits refer to this table
 
     def __repr__(self) -> str:
         return f"version {self.version}\n\nqubits {self.qubits}\n\n" + "\n\n".join(map(repr, self.subcircuits))
@@ -206,26 +343,34 @@ class QuantumCircuit:
 ################ Parsing
 # omitted: matrices, json, strings, functioncalls, annot and pragma, bundles!, map, variables and a lot of operators
 
-def p_program(p):
-    '''Program : OptNewline VERSION Newline QUBITS Newline StatementList OptNewline'''
+def buildQuantumCircuit(version: str, qubits: int, statements) -> QuantumCircuit:
+    # statements are instructions and (name, iterations) subcircuit headers, in program order.
     subcircuits = []
+    instructionTable = InstructionTable()
     instrAcc = []
+    codesAcc = array('i')
     currentName = "default"
     currentIterations = 1
-    for instr in p[6]:
+    for instr in statements:
         if isinstance(instr, Instruction):
             instrAcc += [instr]
+            codesAcc.append(instructionTable.intern(instr))
         else:
             if len(instrAcc) > 0:
-                subcircuits += [Subcircuit(name = currentName, instructions = instrAcc, iterations = currentIterations)]
+                subcircuits += [Subcircuit(name = currentName, instructions = instrAcc, iterations = currentIterations, codes = codesAcc)]
                 instrAcc = []
+                codesAcc = array('i')
             currentName = instr[0]
             currentIterations = instr[1]
 
     if len(instrAcc) > 0:
-        subcircuits += [Subcircuit(name = currentName, instructions = instrAcc, iterations = currentIterations)]
+        subcircuits += [Subcircuit(name = currentName, instructions = instrAcc, iterations = currentIterations, codes = codesAcc)]
     
-    p[0] = QuantumCircuit(version = p[2], qubits = p[4], subcircuits = subcircuits)
+    return QuantumCircuit(version = version, qubits = qubits, subcircuits = subcircuits, instructionTable = instructionTable)
+
+def p_program(p):
+    '''Program : OptNewline VERSION Newline QUBITS Newline StatementList OptNewline'''
+    p[0] = buildQuantumCircuit(version = p[2], qubits = p[4], statements = p[6])
 
 def p_newline(p):
     '''Newline : Newline NEWLINE
@@ -243,7 +388,8 @@ def p_empty(p):
 
 def p_statementlist_add(p):
     '''StatementList : StatementList Newline Statement'''
-    p[0] = p[1] + [p[3]]
+    p[1].append(p[3]) # in place, the list is not shared
+    p[0] = p[1]
 
 def p_statementlist_single(p):
     '''StatementList : Statement'''
@@ -309,20 +455,128 @@ def p_map(p):
 def p_error(p):
     raise Exception(f"Syntax error in input at line {p.lineno}!")
 
-from ply.yacc import yacc
-parser = yacc(debug=debug)
+_lexer = None
+_parser = None
+_buildLock = threading.Lock()
+
+def getLexer():
+    # optimize=True skips the validation of the token rules and reads them from lextab.py (written on first build).
+    global _lexer
+    with _buildLock:
+        if _lexer is None:
+            import ply.lex as lex
+            _lexer = lex.lex(module=sys.modules[__name__], debug=debug, optimize=True, lextab="lextab", outputdir=os.path.dirname(os.path.realpath(__file__)))
+    return _lexer
+
+def getParser():
+    # The grammar signature is still checked against parsetab.py, which is regenerated if the grammar changed.
+    global _parser
+    with _buildLock:
+        if _parser is None:
+            from ply.yacc import yacc
+            _parser = yacc(module=sys.modules[__name__], debug=debug, tabmodule="parsetab", outputdir=os.path.dirname(os.path.realpath(__file__)))
+    return _parser
+
+def __getattr__(name):
+    # Keeps CQASMParser.lexer and CQASMParser.parser working, while only building them when first accessed.
+    # These are shared: code that may run in several threads should use getThreadParser() instead.
+    if name == "lexer":
+        return getLexer()
+    if name == "parser":
+        return getParser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class CQASMParser:
+    # A PLY lexer and parser owned by one thread at a time.
+    # The lexer and the parser keep their state (input, position, line number, parsing stacks) on themselves,
+    # so each instance gets its own copies; the tables and the compiled regexes are shared with getLexer()/getParser().
+    def __init__(self):
+        self.lexer = getLexer().clone()
+        self.parser = copy.copy(getParser())
+
+    def parseString(self, s: str, **args) -> QuantumCircuit:
+        self.lexer.lineno = 1
+        return self.parser.parse(s, lexer=self.lexer, debug=debug, **args)
+
+    def parseFile(self, filename: str, **args) -> QuantumCircuit:
+        with open(filename, 'r') as reader:
+            return self.parseString(reader.read(), **args)
+
+_threadParsers = threading.local()
+
+def getThreadParser() -> CQASMParser:
+    # One CQASMParser per thread, created on the first parse in that thread.
+    parser = getattr(_threadParsers, "parser", None)
+    if parser is None:
+        parser = _threadParsers.parser = CQASMParser()
+    return parser
 
 # To run the lexer only
-# lex.runmain(data="""version 1.0;qubits 10;xm45 q[0]""")
-
-def parseCQASMFile(filename: str, **args):
-    with open(filename, 'r') as reader:
-        return parser.parse(reader.read(), debug=debug, **args)
-
-def parseCQASMString(s: str, **args):
-    return parser.parse(s, debug=debug, **args)
+# lex.runmain(lexer=getLexer(), data="""version 1.0;qubits 10;xm45 q[0]""")
+
+# backend="fast" uses the hand-written parser of FastCQASMParser, which produces the same AST.
+# backend="mmap" is the same parser reading a memory-mapped file; it accepts workers=N to parse chunks in parallel
+# (experimental, slower than workers=1 so far).
+def parseCQASMFile(filename: str, backend: str = "ply", **args):
+    if backend == "fast":
+        from parsing import FastCQASMParser
+        return FastCQASMParser.parseCQASMFile(filename)
+
+    if backend == "mmap":
+        from parsing import FastCQASMParser
+        return FastCQASMParser.parseCQASMFileMapped(filename, **args)
+
+    if backend != "ply":
+        raise Exception(f"Unknown parser backend '{backend}', expected 'ply', 'fast' or 'mmap'")
+
+    return getThreadParser().parseFile(filename, **args)
+
+def iterCQASMFile(filename: str):
+    # Lazily yields (subcircuit name, iterations, instruction) while reading the file line by line (fast backend).
+    from parsing import FastCQASMParser
+    return FastCQASMParser.iterCQASMFile(filename)
+
+def parseCQASMString(s: str, backend: str = "ply", **args):
+    if backend == "fast":
+        from parsing import FastCQASMParser
+        return FastCQASMParser.parseCQASMString(s)
+
+    if backend != "ply":
+        raise Exception(f"Unknown parser backend '{backend}', expected 'ply', 'fast' or 'mmap'")
+
+    return getThreadParser().parseString(s, **args)
+
+def testImportTime():
+    # Importing must be cheap: it must not build the lexer and parser, i.e. neither import ply nor read or write their tables.
+    import subprocess
+    directory = os.path.dirname(os.path.realpath(__file__))
+    tables = [os.path.join(directory, table) for table in ("lextab.py", "parsetab.py")]
+    modified = [os.stat(table).st_mtime_ns for table in tables]
+    code = "import sys, parsing.CQASMParser as p; print(p._lexer is None and p._parser is None, [m for m in ('ply', 'parsing.lextab', 'parsing.parsetab', 'lextab', 'parsetab') if m in sys.modules])"
+    output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(directory), capture_output=True, text=True, check=True).stdout.strip()
+    assert output == "True []", f"importing parsing.CQASMParser builds the parser: {output}"
+    assert [os.stat(table).st_mtime_ns for table in tables] == modified, "importing parsing.CQASMParser rewrites the parser tables"
+
+def testThreads():
+    # Parsing concurrently gives the same circuits as parsing one after the other, and line numbers restart at each parse.
+    from concurrent.futures import ThreadPoolExecutor
+    programs = [f"version 1.0\nqubits {n}\n.c{n}\n" + "".join(f"cnot q[{i}], q[{(i + 1) % n}]\nrx q[{i}], 0.5\n" for i in range(n)) for n in range(2, 40)]
+    expected = [CQASMParser().parseString(program).subcircuits for program in programs]
+    with ThreadPoolExecutor(8) as pool:
+        for _ in range(5):
+            assert [circuit.subcircuits for circuit in pool.map(parseCQASMString, programs)] == expected
+
+    for _ in range(2):
+        try:
+            parseCQASMString("version 1.0\nqubits 2\nh q[0]\nh q[0] q[1]\n")
+            assert False
+        except Exception as e:
+            assert str(e) == "Syntax error in input at line 4!", str(e)
 
 if __name__ == "__main__":
-    result = parseCQASMFile("/shares/bulk/plehenaff/cQASM-tools/metrics/data/Cuccaro_adder_8.qasm")
+    testImportTime()
+    testThreads()
+
+    result = parseCQASMFile(sys.argv[1] if len(sys.argv) > 1 else "/shares/bulk/plehenaff/cQASM-tools/metrics/data/Cuccaro_adder_8.qasm")
 
     print(result)
\ No newline at end of file
@@ -0,0 +1,189 @@
+###################
+# Columnar (struct-of-arrays) representation of a subcircuit made of gates.
+# Instead of one Gate object per gate with a list of operand objects, the gates are stored in parallel NumPy arrays:
+#   opcodes[i]                         index of the name of gate i in gateNames
+#   operandOffsets[i]:operandOffsets[i + 1]   range of the operands of gate i in operandKinds/operandValues
+#   operandKinds[j], operandValues[j]  kind and value of operand j, see below
+# This takes a few tens of bytes per gate instead of hundreds.
+###################
+
+import numpy as np
+from array import array
+from parsing import CQASMParser
+
+# Operand kinds, and the meaning of the operand value for each kind.
+QUBIT = 0       # qubit index
+QUBITS = 1      # index in qubitRanges, a (n, 2) array of start/end qubit indices
+INT = 2         # the integer literal itself
+FLOAT = 3       # index in parameters
+VARIABLE = 4    # index in variables
+
+class CompactSubcircuit:
+    def __init__(self, name: str, iterations: int, gateNames: list[str], opcodes: np.ndarray, operandOffsets: np.ndarray, operandKinds: np.ndarray, operandValues: np.ndarray, qubitRanges: np.ndarray, parameters: np.ndarray, variables: list[str], codes: array = None):
+        assert len(operandOffsets) == len(opcodes) + 1
+        assert len(operandKinds) == len(operandValues) == operandOffsets[-1]
+
+        self.name = name
+        self.iterations = iterations
+        self.gateNames = gateNames
+        self.opcodes = opcodes
+        self.operandOffsets = operandOffsets
+        self.operandKinds = operandKinds
+        self.operandValues = operandValues
+        self.qubitRanges = qubitRanges
+        self.parameters = parameters
+        self.variables = variables
+        self.codes = codes # same meaning as Subcircuit.codes, if known
+
+    @staticmethod
+    def fromInstructions(name: str, iterations: int, instructions, codes: array = None) -> "CompactSubcircuit":
+        # instructions can be any iterable of gates (e.g. a generator): they are not kept.
+        gateNames = {}
+        variables = {}
+        opcodes = array('i')
+        operandOffsets = array('q', [0])
+        operandKinds = array('b')
+        operandValues = array('q')
+        qubitRanges = array('q')
+        parameters = array('d')
+
+        for instruction in instructions:
+            if not isinstance(instruction, CQASMParser.Gate):
+                raise Exception("Not a gate")
+            assert not instruction.controlBits, "Unimplemented: conditional gates"
+
+            opcodes.append(gateNames.setdefault(instruction.name, len(gateNames)))
+
+            for op in instruction.operands:
+                if isinstance(op, CQASMParser.Qubit):
+                    operandKinds.append(QUBIT)
+                    operandValues.append(op.index)
+                elif isinstance(op, CQASMParser.Qubits):
+                    operandKinds.append(QUBITS)
+                    operandValues.append(len(qubitRanges) // 2)
+                    qubitRanges.extend((op.startQubit.index, op.endQubit.index))
+                elif isinstance(op, CQASMParser.Literal) and isinstance(op.value, int):
+                    operandKinds.append(INT)
+                    operandValues.append(op.value)
+                elif isinstance(op, CQASMParser.Literal) and isinstance(op.value, float):
+                    operandKinds.append(FLOAT)
+                    operandValues.append(len(parameters))
+                    parameters.append(op.value)
+                elif isinstance(op, CQASMParser.Variable):
+                    operandKinds.append(VARIABLE)
+                    operandValues.append(variables.setdefault(op.name, len(variables)))
+                else:
+                    raise Exception(f"Unsupported operand {op!r}")
+
+            operandOffsets.append(len(operandKinds))
+
+        return CompactSubcircuit(
+            name = name,
+            iterations = iterations,
+            gateNames = list(gateNames),
+            opcodes = np.frombuffer(opcodes, dtype=np.int32),
+            operandOffsets = np.frombuffer(operandOffsets, dtype=np.int64),
+            operandKinds = np.frombuffer(operandKinds, dtype=np.int8),
+            operandValues = np.frombuffer(operandValues, dtype=np.int64),
+            qubitRanges = np.frombuffer(qubitRanges, dtype=np.int64).reshape(-1, 2),
+            parameters = np.frombuffer(parameters, dtype=np.float64),
+            variables = list(variables),
+            codes = codes,
+        )
+
+    @staticmethod
+    def fromSubcircuit(subcircuit: CQASMParser.Subcircuit) -> "CompactSubcircuit":
+        return CompactSubcircuit.fromInstructions(subcircuit.name, subcircuit.iterations, subcircuit.instructions, codes = subcircuit.codes)
+
+    def toSubcircuit(self) -> CQASMParser.Subcircuit:
+        return CQASMParser.Subcircuit(name = self.name, instructions = list(self), iterations = self.iterations, codes = self.codes)
+
+    def operand(self, j: int) -> CQASMParser.Operand:
+        kind = self.operandKinds[j]
+        value = int(self.operandValues[j])
+        if kind == QUBIT:
+            return CQASMParser.Qubit(index = value)
+        if kind == QUBITS:
+            start, end = self.qubitRanges[value].tolist()
+            return CQASMParser.Qubits(startQubit = CQASMParser.Qubit(start), endQubit = CQASMParser.Qubit(end))
+        if kind == INT:
+            return CQASMParser.Literal(value = value)
+        if kind == FLOAT:
+            return CQASMParser.Literal(value = float(self.parameters[value]))
+        assert kind == VARIABLE
+        return CQASMParser.Variable(name = self.variables[value])
+
+    def qubitOperands(self) -> (np.ndarray, np.ndarray):
+        # CSR arrays of the single-qubit operands only: the qubits of gate i are qubits[offsets[i]:offsets[i + 1]].
+        isQubit = self.operandKinds == QUBIT
+        gateOfOperand = np.repeat(np.arange(len(self)), np.diff(self.operandOffsets))
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gateOfOperand[isQubit], minlength=len(self)), out=offsets[1:])
+        return (offsets, self.operandValues[isQubit])
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __getitem__(self, key):
+        # Materializes Gate objects, for code that needs them.
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+
+        if key < 0:
+            key += len(self)
+        start, end = self.operandOffsets[key:key + 2].tolist()
+        return CQASMParser.Gate(name = self.gateNames[self.opcodes[key]], operands = [self.operand(j) for j in range(start, end)], controlBits = [])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self) -> str:
+        return f".{self.name}\n" + "\n".join(map(repr, self))
+
+def parseCompactCQASMFile(filename: str) -> list[CompactSubcircuit]:
+    # Builds the compact subcircuits of a file while reading it line by line, without creating the full AST.
+    # Consecutive subcircuits with the same name and iterations are merged, since iterCQASMFile does not separate them.
+    subcircuits = []
+    events = CQASMParser.iterCQASMFile(filename)
+    current = next(events, None)
+    while current is not None:
+        name, iterations, _ = current
+
+        def instructions():
+            nonlocal current
+            while current is not None and current[:2] == (name, iterations):
+                yield current[2]
+                current = next(events, None)
+
+        subcircuits += [CompactSubcircuit.fromInstructions(name, iterations, instructions())]
+
+    return subcircuits
+
+
+def test1():
+    cq = """
+version 1.0
+qubits 4
+.testCircuit(2)
+  cnot q[0], q[2]
+  rx q[3], -3.14
+  measure_z q[0:3]
+  cr q[1], 1.5e-3, 2, theta
+  h q[1]
+"""
+
+    subcircuit = CQASMParser.parseCQASMString(cq).subcircuits[0]
+    compact = CompactSubcircuit.fromSubcircuit(subcircuit)
+
+    assert len(compact) == 5
+    assert compact.gateNames == ["cnot", "rx", "measure_z", "cr", "h"]
+    assert compact.toSubcircuit().instructions == subcircuit.instructions
+    assert repr(compact) == repr(subcircuit)
+
+    offsets, qubits = compact.qubitOperands()
+    assert offsets.tolist() == [0, 2, 3, 3, 4, 5]
+    assert qubits.tolist() == [0, 2, 3, 1, 1]
+
+
+if __name__ == "__main__":
+    test1()
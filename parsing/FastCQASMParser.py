@@ -0,0 +1,392 @@
+###################
+# Hand-written parser for the subset of cQasm supported by CQASMParser.py, producing the same AST.
+# Instead of a token stream and an LALR automaton, the input is cut into statements
+# (at newlines and ';', after removing comments) and every statement is matched by precompiled regexes.
+# Select it with CQASMParser.parseCQASMFile(..., backend="fast").
+###################
+
+import re, glob, os, sys, mmap
+from multiprocessing import Pool
+from parsing import CQASMParser
+
+IDENTIFIER = r'[a-zA-Z_][=a-zA-Z_0-9]*'
+INT_LITERAL = r'[+-]?[0-9]+'
+FLOAT_LITERAL = r'[+-]?[0-9]+\.(?:[0-9]+)?(?:e[+-]?[0-9]+)?'
+
+versionRegex = re.compile(r'version[ \t]+([0-9]+(?:\.[0-9]+(?:\.[0-9]+)?)?)')
+qubitsRegex = re.compile(r'qubits[ \t]+([0-9]+)')
+subcircuitRegex = re.compile(rf'\.[ \t]*({IDENTIFIER})(?:[ \t]*\([ \t]*({INT_LITERAL})[ \t]*\))?')
+mapRegex = re.compile(rf'map[ \t]+q[ \t]*\[[ \t]*({INT_LITERAL})[ \t]*\][ \t]*,[ \t]*({IDENTIFIER})')
+gateRegex = re.compile(rf'({IDENTIFIER})[ \t]+(.*)')
+argumentRegex = re.compile(rf'[ \t]*(?:q[ \t]*\[[ \t]*(?P<qubit>{INT_LITERAL})[ \t]*(?::[ \t]*(?P<endQubit>{INT_LITERAL})[ \t]*)?\]|(?P<float>{FLOAT_LITERAL})|(?P<int>{INT_LITERAL})|(?P<identifier>{IDENTIFIER}))[ \t]*')
+blockCommentRegex = re.compile(r'/\*.*?\*/', re.DOTALL)
+statementSeparatorRegex = re.compile(r'[\r;]')
+mappedLineRegex = re.compile(rb'[^\n]*\n|[^\n]+')
+
+class CQASMSyntaxError(Exception):
+    def __init__(self, lineno: int):
+        super().__init__(f"Syntax error in input at line {lineno}!")
+        self.lineno = lineno
+
+def syntaxError(lineno: int):
+    return CQASMSyntaxError(lineno)
+
+def iterStatements(lines):
+    # Yields (line number, statement text) for every non-empty statement of the given lines.
+    # Block comments may span several lines; '#' comments run until the end of the line.
+    inBlockComment = False
+    for lineno, line in enumerate(lines, start = 1):
+        if inBlockComment:
+            end = line.find("*/")
+            if end == -1:
+                continue
+            line = line[end + 2:]
+            inBlockComment = False
+
+        if "/*" in line:
+            line = blockCommentRegex.sub(" ", line)
+            start = line.find("/*")
+            if start != -1:
+                line = line[:start]
+                inBlockComment = True
+
+        comment = line.find("#")
+        if comment != -1:
+            line = line[:comment]
+
+        for statement in statementSeparatorRegex.split(line):
+            statement = statement.strip()
+            if statement:
+                yield (lineno, statement)
+
+def parseArgument(text: str, lineno: int) -> CQASMParser.Operand:
+    m = argumentRegex.fullmatch(text)
+    if m is None:
+        raise syntaxError(lineno)
+
+    if m.group('qubit') is not None:
+        if m.group('endQubit') is not None:
+            return CQASMParser.Qubits(startQubit = CQASMParser.Qubit(int(m.group('qubit'))), endQubit = CQASMParser.Qubit(int(m.group('endQubit'))))
+        return CQASMParser.Qubit(index = int(m.group('qubit')))
+
+    if m.group('float') is not None:
+        return CQASMParser.Literal(value = float(m.group('float')))
+
+    if m.group('int') is not None:
+        return CQASMParser.Literal(value = int(m.group('int')))
+
+    if m.group('identifier') in CQASMParser.reserved_keywords:
+        raise syntaxError(lineno)
+    return CQASMParser.Variable(name = m.group('identifier'))
+
+def parseStatement(text: str, lineno: int):
+    # Returns a Gate, a Mapping or a (name, iterations) subcircuit header, like the Statement rule of the PLY grammar.
+    # The PLY lexer reads "version 1.0" and "qubits 3" as VERSION and QUBITS tokens, which only the header accepts,
+    # so a statement starting like them is not a gate named version or qubits.
+    if versionRegex.match(text) or qubitsRegex.match(text):
+        raise syntaxError(lineno)
+
+    m = gateRegex.fullmatch(text)
+    if m is not None and m.group(1) not in CQASMParser.reserved_keywords:
+        return CQASMParser.Gate(name = m.group(1), operands = [parseArgument(a, lineno) for a in m.group(2).split(',')], controlBits = [])
+
+    m = subcircuitRegex.fullmatch(text)
+    if m is not None:
+        return (m.group(1), 1 if m.group(2) is None else int(m.group(2)))
+
+    m = mapRegex.fullmatch(text)
+    if m is not None and m.group(2) not in CQASMParser.reserved_keywords:
+        return CQASMParser.Mapping(variable = m.group(2), targetQubit = int(m.group(1)))
+
+    raise syntaxError(lineno)
+
+def parseHeader(statements) -> (str, int, int):
+    # Consumes the version and qubits statements; returns them with the line number of the last one.
+    lineno, text = next(statements, (0, ""))
+    m = versionRegex.fullmatch(text)
+    if m is None:
+        raise syntaxError(lineno)
+    version = m.group(1)
+
+    lineno, text = next(statements, (lineno, ""))
+    m = qubitsRegex.fullmatch(text)
+    if m is None:
+        raise syntaxError(lineno)
+
+    return (version, int(m.group(1)), lineno)
+
+def parseLines(lines) -> CQASMParser.QuantumCircuit:
+    statements = iterStatements(lines)
+    version, qubits, lineno = parseHeader(statements)
+
+    body = [parseStatement(text, lineno) for lineno, text in statements]
+    if not body:
+        raise syntaxError(lineno)
+
+    return CQASMParser.buildQuantumCircuit(version = version, qubits = qubits, statements = body)
+
+def iterInstructions(lines):
+    # Yields (subcircuit name, iterations, instruction) for every instruction, as soon as its line is read.
+    statements = iterStatements(lines)
+    _, _, lineno = parseHeader(statements)
+
+    name, iterations = ("default", 1)
+    empty = True
+    for lineno, text in statements:
+        empty = False
+        statement = parseStatement(text, lineno)
+        if isinstance(statement, CQASMParser.Instruction):
+            yield (name, iterations, statement)
+        else:
+            name, iterations = statement
+
+    if empty:
+        raise syntaxError(lineno)
+
+def iterCQASMFile(filename: str):
+    # Reads the file line by line: memory use does not depend on the size of the file.
+    # E.g. getPathStatsStreaming(gate for _, _, gate in iterCQASMFile(filename)).
+    with open(filename, 'r') as reader:
+        yield from iterInstructions(reader)
+
+def iterMappedLines(buffer, start: int, end: int):
+    # Lines of buffer[start:end], decoded one at a time: the whole buffer is never copied nor decoded.
+    for m in mappedLineRegex.finditer(buffer, start, end):
+        yield m.group().decode()
+
+def parseMappedChunk(filename: str, start: int, end: int, withHeader: bool):
+    # Parses the statements of the lines in bytes [start, end) of the file. Line numbers in errors are relative
+    # to the chunk, so errors are returned with the number of lines for the caller to fix them up.
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as buffer:
+        numberOfLines = 0
+        def countedLines():
+            nonlocal numberOfLines
+            for line in iterMappedLines(buffer, start, end):
+                numberOfLines += 1
+                yield line
+
+        header = None
+        body = []
+        statements = iterStatements(countedLines())
+        try:
+            if withHeader:
+                header = parseHeader(statements)[:2]
+            body = [parseStatement(text, lineno) for lineno, text in statements]
+        except CQASMSyntaxError as e:
+            return (header, body, numberOfLines, e.lineno)
+        finally:
+            statements.close() # releases the buffer before it is unmapped
+
+        return (header, body, numberOfLines, None)
+
+def parseMappedHeader(buffer) -> (str, int, int, int, bool):
+    # Parses the version and qubits statements at the start of buffer. Returns them with the line number of the qubits
+    # statement, the offset of the line after it, and whether other statements follow qubits on its line.
+    lineEnds = []
+    def lines():
+        for m in mappedLineRegex.finditer(buffer):
+            lineEnds.append(m.end())
+            yield m.group().decode()
+
+    statements = iterStatements(lines())
+    try:
+        version, qubits, lineno = parseHeader(statements)
+        following = next(statements, None)
+    finally:
+        statements.close() # releases the buffer before it is unmapped
+
+    return (version, qubits, lineno, lineEnds[lineno - 1], following is not None and following[0] == lineno)
+
+def parseCQASMFileMapped(filename: str, workers: int = 1) -> CQASMParser.QuantumCircuit:
+    # Parses a memory-mapped file. With workers > 1 (experimental: starting the processes and sending the ASTs back
+    # costs more than it saves, e.g. 17 s instead of 6.8 s on a 1.3 GB file), the header is parsed first and the rest
+    # of the file is split at newlines into non-empty chunks (at most one per line), parsed in parallel processes.
+    # Files containing block comments (which may span chunks), or with statements after qubits on its line, are parsed in one chunk.
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return parseLines([])
+
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as buffer:
+            header = None
+            if workers > 1 and buffer.find(b"/*") == -1:
+                version, qubits, headerLineno, headerEnd, sameLine = parseMappedHeader(buffer)
+                if not sameLine:
+                    header = (version, qubits)
+                    boundaries = [headerEnd]
+                    for k in range(1, workers):
+                        newline = buffer.find(b"\n", max(boundaries[-1], headerEnd + k * (size - headerEnd) // workers))
+                        if newline == -1:
+                            break
+                        boundaries += [newline + 1]
+                    boundaries = sorted(set(boundaries + [size]))
+
+    if header is None:
+        chunks = [(filename, 0, size, True)]
+        firstLineno = 0
+    else:
+        chunks = [(filename, start, end, False) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+        firstLineno = headerLineno
+
+    if len(chunks) <= 1:
+        results = [parseMappedChunk(*chunk) for chunk in chunks]
+    else:
+        with Pool(len(chunks)) as p:
+            results = p.starmap(parseMappedChunk, chunks)
+
+    for chunkHeader, body, numberOfLines, errorLineno in results:
+        if errorLineno is not None:
+            raise syntaxError(firstLineno + errorLineno)
+        firstLineno += numberOfLines
+
+    version, qubits = header if header is not None else results[0][0]
+    statements = [statement for _, body, _, _ in results for statement in body]
+    if not statements:
+        raise syntaxError(firstLineno)
+
+    return CQASMParser.buildQuantumCircuit(version = version, qubits = qubits, statements = statements)
+
+def parseCQASMFile(filename: str) -> CQASMParser.QuantumCircuit:
+    with open(filename, 'r') as reader:
+        return parseLines(reader)
+
+def parseCQASMString(s: str) -> CQASMParser.QuantumCircuit:
+    return parseLines(s.split('\n'))
+
+
+def checkSameCircuit(a: CQASMParser.QuantumCircuit, b: CQASMParser.QuantumCircuit):
+    assert a.version == b.version and a.qubits == b.qubits
+    assert len(a.subcircuits) == len(b.subcircuits)
+    for sa, sb in zip(a.subcircuits, b.subcircuits):
+        assert (sa.name, sa.iterations) == (sb.name, sb.iterations)
+        assert sa.instructions == sb.instructions
+        assert sa.codes == sb.codes
+    assert repr(a) == repr(b)
+
+def checkConformance(fileNames: list[str]):
+    # Every file accepted by the PLY backend must give the same AST with the fast one. The fast backend may accept
+    # more: PLY's comment token swallows the newline, so a '#' comment after a statement is a syntax error there.
+    for fileName in fileNames:
+        try:
+            expected = CQASMParser.parseCQASMFile(fileName, backend = "ply")
+        except Exception:
+            expected = None
+
+        try:
+            result = CQASMParser.parseCQASMFile(fileName, backend = "fast")
+        except Exception:
+            result = None
+
+        if expected is not None:
+            assert result is not None, f"Fast backend rejects {fileName}"
+            checkSameCircuit(expected, result)
+
+def test1():
+    cq = """
+version 1.0
+# this file has been automatically generated by the OpenQL compiler please do not modify it manually.
+qubits 10
+
+x q[0]; y q[1]
+/* a block
+   comment */
+.testCircuit(3)
+  cnot q[0], q[2]
+  rx q [ 3 ] , -3.14
+  measure_z q[0:3]
+  map q[2], anc
+  cr q[1], 1.5e-3, 2, theta
+. other
+  h q[9]
+"""
+
+    checkSameCircuit(CQASMParser.parseCQASMString(cq, backend = "ply"), CQASMParser.parseCQASMString(cq, backend = "fast"))
+
+def test2():
+    for cq in ["qubits 2\nversion 1.0\nh q[0]", "version 1.0\nqubits 2\n", "version 1.0\nqubits 2\nif q[0]", "version 1.0\nqubits 2\nh q[0],, q[1]", "version 1.0\nqubits 2\nh .5",
+               "version 1.0\nqubits 2\nh q[0]\nqubits 3", "version 1.0\nqubits 2\nh q[0]\nversion 2.0", "version 1.0\nqubits 2\n.c\n  qubits 3, q[0]"]:
+        for backend in ("ply", "fast"):
+            try:
+                CQASMParser.parseCQASMString(cq, backend = backend)
+            except Exception:
+                continue
+            assert False, f"{backend} accepted {cq!r}"
+
+def test3():
+    cq = """
+version 1.0
+qubits 3
+h q[0]
+.loop(10)
+  cnot q[0], q[1]; map q[2], anc
+.other
+.end
+  x q[2]
+"""
+
+    events = list(iterInstructions(cq.split('\n')))
+    assert [(name, iterations, repr(instr)) for name, iterations, instr in events] == [
+        ("default", 1, "h q[0]"),
+        ("loop", 10, "cnot q[0], q[1]"),
+        ("loop", 10, "map 2, anc"),
+        ("end", 1, "x q[2]"),
+    ]
+
+    ast = parseCQASMString(cq)
+    assert [instr for _, _, instr in events] == [instr for subcircuit in ast.subcircuits for instr in subcircuit.instructions]
+
+def test4():
+    import tempfile
+
+    lines = ["version 1.0", "qubits 5", "# header comment"] + [f"h q[{i % 5}]; cnot q[{i % 5}], q[{(i + 1) % 5}]" if i % 7 else f".sub{i}({i})" for i in range(1000)]
+    with tempfile.TemporaryDirectory() as directory:
+        fileName = os.path.join(directory, "test.qasm")
+        with open(fileName, "w") as f:
+            f.write("\n".join(lines))
+
+        expected = parseCQASMFile(fileName)
+        for workers in (1, 3, 8):
+            checkSameCircuit(expected, parseCQASMFileMapped(fileName, workers = workers))
+
+        # More workers than lines, and chunk boundaries falling inside the header or right after it.
+        for cq in ["version 1.0\nqubits 2\nh q[0]\ncnot q[0], q[1]\n", "version 1.0\n\n# comment\nqubits 2\nh q[0]", "version 1.0\nqubits 2; h q[0]\nh q[1]\n"]:
+            with open(fileName, "w") as f:
+                f.write(cq)
+            expected = parseCQASMFile(fileName)
+            for workers in range(1, 12):
+                checkSameCircuit(expected, parseCQASMFileMapped(fileName, workers = workers))
+
+        for cq, lineno in [("version 1.0\nqubits 2\n\n", 3), ("version 1.0\nqbits 2\nh q[0]\n", 2)]:
+            with open(fileName, "w") as f:
+                f.write(cq)
+            for workers in (1, 4):
+                try:
+                    parseCQASMFileMapped(fileName, workers = workers)
+                except CQASMSyntaxError as e:
+                    assert e.lineno == lineno, (cq, workers, e.lineno)
+                    continue
+                assert False
+
+        with open(fileName, "w") as f:
+            f.write("\n".join(lines))
+
+        with open(fileName, "a") as f:
+            f.write("\nh q[0],, q[1]\n")
+
+        for workers in (1, 3):
+            try:
+                parseCQASMFileMapped(fileName, workers = workers)
+            except CQASMSyntaxError as e:
+                assert e.lineno == len(lines) + 1
+                continue
+            assert False
+
+
+if __name__ == "__main__":
+    test1()
+    test2()
+    test3()
+    test4()
+
+    # Conformance on the whole corpus (or on the files given as arguments).
+    checkConformance(sys.argv[1:] or glob.glob(os.path.dirname(os.path.realpath(__file__)) + "/../metrics/data/*.qasm"))
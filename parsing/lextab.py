@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('BREAK', 'COND', 'CONTINUE', 'ELSE', 'FLOAT_LITERAL', 'FOR', 'IDENTIFIER', 'IF', 'INT_LITERAL', 'MAP', 'NEWLINE', 'OPERATOR', 'Q', 'QUBITS', 'SET', 'THEN', 'VAR', 'VERSION', 'WHILE'))
+_lexreflags   = 64
+_lexliterals  = '!,.:-[]()'
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_VERSION>version[ \\t]+(?P<versionNumber>[0-9]+(\\.[0-9]+(\\.[0-9]+)?)?))|(?P<t_QUBITS>qubits[ \\t]+(?P<numberOfQubits>[0-9]+))|(?P<t_IDENTIFIER>[a-zA-Z_][=a-zA-Z_0-9]*)|(?P<t_FLOAT_LITERAL>[+-]?[0-9]+\\.([0-9]+)?(e[+-]?[0-9]+)?)|(?P<t_INT_LITERAL>[+-]?[0-9]+)|(?P<t_NEWLINE>[\\n\\r;]+)|(?P<t_ignore_comment>(/\\*(.|\\n)*?\\*/)|([#].*\\n))|(?P<t_ignore_whitespace>[\\ \\t]+)', [None, ('t_VERSION', 'VERSION'), None, None, None, ('t_QUBITS', 'QUBITS'), None, ('t_IDENTIFIER', 'IDENTIFIER'), ('t_FLOAT_LITERAL', 'FLOAT_LITERAL'), None, None, ('t_INT_LITERAL', 'INT_LITERAL'), ('t_NEWLINE', 'NEWLINE'), ('t_ignore_comment', 'ignore_comment'), None, None, None, (None, None)])]}
+_lexstateignore = {'INITIAL': ''}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
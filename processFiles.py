@@ -1,94 +1,415 @@
-import typing
-import glob, os, csv
+import argparse, glob, hashlib, os, signal, sys
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
 from parsing import CQASMParser
-from metrics.longestRepeatingSubcircuit import longestRepeatingSubcircuit
-from metrics.paths import getPathStats
-from multiprocessing import Pool, Value
+from parsing.CompactSubcircuit import parseCompactCQASMFile
+from metrics.registry import METRICS, computeMetrics, computeProgramMetrics, programNeeds, intermediate, columnsOf
+from metrics.paths import DurationModel
+from metrics.cache import ResultCache, fileHash
+from metrics.checkpoint import CheckpointedOutput
+from metrics import outputs
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import Connection, wait
 
 OUTPUT_FILE = os.path.dirname(os.path.realpath(__file__)) + "/result.csv"
+CACHE_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) + "/.metricsCache"
+DATA_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) + "/metrics/data"
 
+# The metrics computed by default, see metrics/registry.py for all of them.
+# programPathStats (whole program, iterations included) is not a default: its summaries cost a few times pathStats on wide circuits.
+DEFAULT_METRICS = ["longestRepeatingSubcircuit", "pathStats"]
 
-# MAX_NUM_LINES = 50000
-# files = []
+def metricVersions(durationModel: DurationModel = None) -> dict:
+    # The versions of the metrics for the cache. Those needing the duration model get one version per model,
+    # so that results computed with other durations are not reused.
+    suffix = "-" + hashlib.sha256(durationModel.toJSON().encode()).hexdigest()[:16] if durationModel is not None else ""
+    return { name: f"{metric.version}{suffix}" if suffix and "durationModel" in metric.needs else metric.version for name, metric in METRICS.items() }
 
-# for f in glob.glob(os.path.dirname(os.path.realpath(__file__)) + "/metrics/data/*.qasm"):
-#     num_lines = sum(1 for _ in open(f))
+def outputColumns(metrics: list[str]) -> dict[str, str]:
+    # The columns of the output and their types (see metrics/outputs.py), sorted by name.
+    columnTypes = { "FileName": "string", "SubcircuitIndex": "int", "Status": "string", **columnsOf(metrics) }
+    return { column: columnTypes[column] for column in sorted(columnTypes) }
 
-#     if num_lines > MAX_NUM_LINES:
-#         files.append(f)
+# The output is written (and checkpointed) when FLUSH_FILES files are done, or after FLUSH_INTERVAL seconds.
+FLUSH_FILES = 64
+FLUSH_INTERVAL = 10.
 
-files = glob.glob(os.path.dirname(os.path.realpath(__file__)) + "/metrics/data/*.qasm")
+# How a file is processed. A task killed for its time or memory is retried once with CHEAP:
+# the compact representation instead of the AST, and no longest repeating subcircuit nor program path statistics (left empty in the output).
+FULL = dict(parser = "ply", exclude = ())
+CHEAP = dict(parser = "compact", exclude = ("longestRepeatingSubcircuit", "programPathStats"))
 
-# files = ["/shares/bulk/plehenaff/cQASM-tools/metrics/data/q=11_s=89_2qbf=022_1.qasm"]
+# Values of the Status column:
+#   ok                  computed with FULL
+#   error               the file could not be processed (e.g. syntax error), no metrics
+#   timeout, memory     the task was killed for exceeding the time or memory limit, no metrics
+#   crashed             the worker died while processing the file, no metrics
+#   retried-<reason>    computed with CHEAP after the FULL task was killed for <reason>
 
-counter = Value('i', 0)
+# A file gives one row per subcircuit, then, if program metrics are asked for, one row for the whole program
+# (SubcircuitIndex empty and Status ok or retried-<reason>) with their columns.
 
-statistics = sorted([
-    "FileName",
-    "SubcircuitIndex",
-    "LengthOfLongestRepeatingSubcircuit",
-    "NumberOfRepetitionsOfLongestRepeatingSubcircuit",
-    "NumberOfGatesInCriticalPath",
-    "MaxNumberOfTwoQubitGatesInCriticalPath",
-    "NumberOfCriticalPaths",
-    "NumberOfCriticalPathsWithMaxTwoQubitsGates",
-    "PathLengthMean",
-    "PathLengthStandardDeviation",
-])
+def isProgramMetric(metric: str) -> bool:
+    return METRICS[metric].scope == "program"
 
-def writeToFile(data: dict):
-    with open(OUTPUT_FILE, "a") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=statistics)
-        assert(sorted(data.keys()) == statistics)
-        writer.writerow(data)
-    
-    global counter
-    counter.value += 1
-    print(f"Done {counter.value} / {len(files)} files")
+def rowsOf(metric: str, rows: list[dict]) -> list[dict]:
+    # The rows of a file holding the columns of metric: the subcircuit rows, or the program row.
+    return [row for row in rows if (row["SubcircuitIndex"] == "") == isProgramMetric(metric)]
 
-def processFile(fileName):
+POLL_INTERVAL = 0.1 # seconds between checks of the running tasks
+
+def emptyRow(fileName: str, status: str) -> dict:
+    # Columns missing from a row are written empty.
+    return { "FileName": os.path.basename(fileName), "SubcircuitIndex": "", "Status": status }
+
+def processFile(fileName, configuration: dict = FULL, status: str = "ok", metrics = DEFAULT_METRICS, durationModel: DurationModel = None) -> list[dict]:
+    # Runs in a worker: returns the rows of the file (one per subcircuit, and the program row), which the parent writes.
+    # The metrics excluded by the configuration are not computed, their columns are empty.
+    # durationModel is for the metrics needing gate durations (1 per gate if None).
+    # Program metrics are computed from small summaries kept from each subcircuit, whose DDG is dropped once done.
+    metrics = [metric for metric in metrics if metric not in configuration["exclude"]]
+    subcircuitMetrics = [metric for metric in metrics if not isProgramMetric(metric)]
+    programMetrics = [metric for metric in metrics if isProgramMetric(metric)]
+    needs = programNeeds(programMetrics)
     try:
-        ast = CQASMParser.parseCQASMFile(fileName)
-
-        for index, subcircuit in enumerate(ast.subcircuits):
-            repeatingSubcircuitStats = longestRepeatingSubcircuit(subcircuit.instructions)
-            lengthOfLongestRepeatingSubcircuit = len(repeatingSubcircuitStats["LongestRepeatingSubcircuit"])
-            numberOfRepetitionsOfLongestRepeatingSubcircuit = repeatingSubcircuitStats["NumberOfRepetitionsOfLongestRepeatingSubcircuit"]
-
-            pathStats = getPathStats(subcircuit.instructions)
-
-            thisSubcircuitData = {
-                "FileName": os.path.basename(fileName),
-                "SubcircuitIndex": index,
-                "LengthOfLongestRepeatingSubcircuit": lengthOfLongestRepeatingSubcircuit,
-                "NumberOfRepetitionsOfLongestRepeatingSubcircuit": numberOfRepetitionsOfLongestRepeatingSubcircuit,
-                "NumberOfGatesInCriticalPath": pathStats["NumberOfGatesInCriticalPath"],
-                "MaxNumberOfTwoQubitGatesInCriticalPath": pathStats["MaxNumberOfTwoQubitGatesInCriticalPath"],
-                "NumberOfCriticalPaths": pathStats["NumberOfCriticalPaths"],
-                "NumberOfCriticalPathsWithMaxTwoQubitsGates": pathStats["NumberOfCriticalPathsWithMaxTwoQubitsGates"],
-                "PathLengthMean": pathStats["PathLengthMean"],
-                "PathLengthStandardDeviation": pathStats["PathLengthStandardDeviation"],
-            }
-
-            writeToFile(thisSubcircuitData)
-        
+        if configuration["parser"] == "compact":
+            subcircuits = parseCompactCQASMFile(fileName)
+        else:
+            subcircuits = CQASMParser.parseCQASMFile(fileName, backend = configuration["parser"]).subcircuits
+
+        rows = []
+        kept = []
+        for index, subcircuit in enumerate(subcircuits):
+            thisSubcircuitData = emptyRow(fileName, status)
+            thisSubcircuitData["SubcircuitIndex"] = index
+            built = { "durationModel": durationModel } if durationModel is not None else {}
+            thisSubcircuitData.update(computeMetrics(subcircuit, subcircuitMetrics, built))
+            kept.append({ need: intermediate(need, subcircuit, built) for need in needs })
+            rows.append(thisSubcircuitData)
+
+        if programMetrics:
+            rows.append({ **emptyRow(fileName, status), **computeProgramMetrics(programMetrics, kept) })
+
+        return rows
+
     except Exception as e:
-        print(f"File {fileName} gave error: {e} and was not processed")
+        print(f"File {fileName} gave error: {e} and was not processed", file=sys.stderr)
+
+        return [emptyRow(fileName, "error")]
+
+def worker(connection: Connection):
+    # Receives chunks of tasks, and sends back the rows of each task as soon as it is done. None means stop.
+    # The parent stops the workers on Ctrl-C or SIGTERM; a worker whose parent died (e.g. killed) stops by itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    parent = os.getppid()
+    while True:
+        if not connection.poll(POLL_INTERVAL * 10):
+            if os.getppid() != parent:
+                return
+            continue
+
+        chunk = connection.recv()
+        if chunk is None:
+            return
+        for task in chunk:
+            connection.send(processFile(*task))
+
+def residentMemory(pid: int) -> int:
+    # In bytes, 0 if unknown (no /proc, or the process is gone).
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+@dataclass
+class Worker:
+    process: Process
+    connection: Connection
+    pending: deque # tasks sent to the worker and not answered yet, the first one is running
+    started: float = 0. # when the first pending task started
+
+def startWorker() -> Worker:
+    connection, child = Pipe()
+    process = Process(target = worker, args = (child,), daemon = True)
+    process.start()
+    child.close()
+    return Worker(process = process, connection = connection, pending = deque())
+
+def stopWorker(w: Worker, kill: bool = False):
+    if kill:
+        w.process.kill()
+    else:
+        w.connection.send(None)
+    w.process.join()
+    w.connection.close()
+
+def availableCores() -> int:
+    # The cores this process may run on, which can be fewer than os.cpu_count() (e.g. under taskset or in a container).
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def largestFirst(fileNames: list[str]) -> list[str]:
+    # Starting with the biggest files keeps one of them from being picked last and running alone at the end.
+    return sorted(fileNames, key = os.path.getsize, reverse = True)
+
+def mergeCached(fileName: str, rows: list[dict], cached: dict[str, list[dict]], status: str = "ok"):
+    # Adds the cached results of metrics to the rows of a file, with a program row if there is none yet.
+    for metric, results in cached.items():
+        if isProgramMetric(metric) and not rowsOf(metric, rows):
+            rows.append(emptyRow(fileName, status))
+        metricRows = rowsOf(metric, rows)
+        if len(metricRows) == len(results):
+            for row, result in zip(metricRows, results):
+                row.update(result)
+
+def cachedRows(fileName: str, cached: dict[str, list[dict]]) -> list[dict]:
+    # The rows of a file whose metrics are all cached (without subcircuit rows if they are all program metrics).
+    numberOfSubcircuits = max((len(results) for metric, results in cached.items() if not isProgramMetric(metric)), default = 0)
+    rows = [{ **emptyRow(fileName, "ok"), "SubcircuitIndex": index } for index in range(numberOfSubcircuits)]
+    mergeCached(fileName, rows, cached)
+    return rows
+
+def processFiles(fileNames: list[str], outputFile: str = OUTPUT_FILE, workers: int = None, chunksize: int = 1, timeout: float = None, memoryLimit: int = None,
+                 cacheDirectory: str = None, invalidate = (), resume: bool = True, outputFormat: str = None, metrics: list[str] = DEFAULT_METRICS,
+                 durationModel: DurationModel = None):
+    # The workers only compute: rows come back to this process, which is the only one writing to outputFile.
+    # outputFormat is one of outputs.FORMATS, by default given by the extension of outputFile (CSV otherwise).
+    # Rows are written per file in completion order, so the output is not sorted.
+    # timeout (seconds) and memoryLimit (MiB, resident memory of the worker) apply to each file. The worker of a
+    # task over a limit is killed and replaced; the other tasks of its chunk are given out again.
+    # With a cacheDirectory, only the metrics that are not cached for the content of a file are computed, and the results
+    # of successful tasks are added to the cache. The metrics in invalidate are computed again (and replaced in the cache).
+    # The output is checkpointed after each file (see metrics/checkpoint.py): running the same command again after an
+    # interruption skips the files already written, unless resume is False.
+    # durationModel gives the gate durations of criticalPathDuration (1 per gate if None).
+    cache = ResultCache(cacheDirectory) if cacheDirectory else None
+    versions = metricVersions(durationModel)
+    cached = {} # file name -> (content hash, cached results of the file)
+    tasks = deque()
+
+    outputFormat = outputFormat or outputs.formatOfFile(outputFile)
+    if outputFormat == "parquet":
+        outputs.checkParquet()
+
+    columnTypes = outputColumns(metrics)
+    header = { "format": outputFormat, "columns": columnTypes }
+    if durationModel is not None:
+        header["durations"] = durationModel.toJSON()
+    output = CheckpointedOutput(outputFile, header = header, resume = resume)
+    pendingRows = []
+    pendingFiles = {} # file name -> subcircuit indices, for the rows in pendingRows
+    lastFlush = monotonic()
+    flushing = False
+    started = False # the header and the first manifest line are written: rows can be flushed
+
+    def flush():
+        nonlocal lastFlush, flushing
+        flushing = True
+        writer.writeRows(pendingRows)
+        output.commit(pendingFiles)
+        pendingRows.clear()
+        pendingFiles.clear()
+        lastFlush = monotonic()
+        flushing = False
+
+    try:
+        writer = outputs.OUTPUTS[outputFormat](output.file, columnTypes)
+        if not output.resumed:
+            writer.writeHeader()
+        output.begin()
+        started = True
+
+        done = len(output.completed)
+        if done:
+            print(f"Resuming {outputFile}: {done} files already done", file=sys.stderr)
+
+        def finish(task, rows):
+            nonlocal done
+            fileName, _, status, taskMetrics, _ = task
+            if fileName in cached:
+                key, results = cached.pop(fileName)
+                # Rows with another status than the task (error, or killed twice) hold no metrics.
+                if all(row["Status"] == status for row in rows):
+                    if status == "ok":
+                        cache.put(key, { metric: [{ column: row[column] for column in METRICS[metric].columns } for row in rowsOf(metric, rows)] for metric in taskMetrics }, versions)
+                    mergeCached(fileName, rows, results, status)
+            if all(isProgramMetric(metric) for metric in metrics):
+                rows = [row for row in rows if row["SubcircuitIndex"] == ""]
+            pendingRows.extend(rows)
+            pendingFiles[os.path.realpath(fileName)] = [row["SubcircuitIndex"] for row in rows if row["SubcircuitIndex"] != ""]
+            if len(pendingFiles) >= FLUSH_FILES or monotonic() - lastFlush > FLUSH_INTERVAL:
+                flush()
+            done += 1
+            print(f"Done {done} / {len(fileNames)} files", file=sys.stderr)
+
+        def replace(w: Worker, reason: str) -> Worker:
+            stopWorker(w, kill = True)
+            task = w.pending.popleft()
+            tasks.extendleft(reversed(w.pending))
+            fileName, configuration, _, metrics, _ = task
+            if configuration is FULL:
+                tasks.appendleft((fileName, CHEAP, f"retried-{reason}", metrics, durationModel))
+            else:
+                finish(task, [emptyRow(fileName, reason)])
+            return startWorker()
+
+        for fileName in largestFirst([fileName for fileName in fileNames if os.path.realpath(fileName) not in output.completed]):
+            if cache is None:
+                tasks.append((fileName, FULL, "ok", tuple(metrics), durationModel))
+                continue
+
+            key = fileHash(fileName)
+            results = cache.get(key, { metric: versions[metric] for metric in metrics }, ignore = invalidate)
+            missing = tuple(metric for metric in metrics if metric not in results)
+            if missing:
+                cached[fileName] = (key, results)
+                tasks.append((fileName, FULL, "ok", missing, durationModel))
+            else:
+                finish((fileName, FULL, "ok", (), durationModel), cachedRows(fileName, results))
+
+        pool = [startWorker() for _ in range(min(workers or availableCores(), len(tasks)))]
+        try:
+            while tasks or any(w.pending for w in pool):
+                for w in pool:
+                    if not w.pending and tasks:
+                        chunk = [tasks.popleft() for _ in range(min(chunksize, len(tasks)))]
+                        w.connection.send(chunk)
+                        w.pending.extend(chunk)
+                        w.started = monotonic()
+
+                ready = wait([w.connection for w in pool if w.pending], timeout = POLL_INTERVAL)
+
+                for i, w in enumerate(pool):
+                    if w.connection in ready:
+                        try:
+                            rows = w.connection.recv()
+                        except EOFError:
+                            pool[i] = replace(w, "crashed")
+                            continue
+                        task = w.pending.popleft()
+                        w.started = monotonic()
+                        finish(task, rows)
+
+                    if not w.pending:
+                        continue
+                    if timeout is not None and monotonic() - w.started > timeout:
+                        pool[i] = replace(w, "timeout")
+                    elif memoryLimit is not None and residentMemory(w.process.pid) > memoryLimit * 1024 * 1024:
+                        pool[i] = replace(w, "memory")
+        finally:
+            for w in pool:
+                stopWorker(w, kill = bool(w.pending))
+        flush()
+    except BaseException:
+        try:
+            if started and not flushing: # otherwise the rows may be half written: they are dropped when resuming
+                flush() # keeps the files that are done
+        finally:
+            output.close()
+        raise
+
+    output.finalize(convert = (lambda partialFile, fileName: outputs.toParquet(partialFile, fileName, columnTypes)) if outputFormat == "parquet" else None)
+
 
+def expandInputs(inputs: list[str]) -> list[str]:
+    # Files, glob patterns (** matches subdirectories) and directories (all the .qasm files below them), without duplicates.
+    fileNames = {}
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(glob.escape(pattern), "**", "*.qasm"), recursive = True)
+        else:
+            matches = [f for f in glob.glob(pattern, recursive = True) if os.path.isfile(f)]
+        if not matches:
+            print(f"No cQASM file matches {pattern}", file=sys.stderr)
+        fileNames.update(dict.fromkeys(sorted(matches)))
+    return list(fileNames)
+
+def numberOfLines(fileName: str) -> int:
+    with open(fileName, "rb") as f:
+        return sum(block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b""))
+
+def filterBySize(fileNames: list[str], maxLines: int = None, maxBytes: int = None) -> list[str]:
+    # Drops the files with more than maxLines lines or maxBytes bytes (no limit if None).
+    kept = [f for f in fileNames if (maxBytes is None or os.path.getsize(f) <= maxBytes) and (maxLines is None or numberOfLines(f) <= maxLines)]
+    if len(kept) < len(fileNames):
+        print(f"Skipping {len(fileNames) - len(kept)} files over the size limit", file=sys.stderr)
+    return kept
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog = "cqasm-metrics", description = "Metrics of cQASM circuits.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    run = commands.add_parser("run", help = "compute the metrics of cQASM files into a CSV (or NDJSON, Parquet) file")
+    run.add_argument("inputs", nargs = "*", default = [DATA_DIRECTORY], help = "cQASM files, glob patterns or directories (default: metrics/data)")
+    run.add_argument("-o", "--output", default = OUTPUT_FILE, help = "default: %(default)s")
+    run.add_argument("--format", choices = outputs.FORMATS, help = "format of the output (default: from the extension of --output, else csv)")
+    run.add_argument("-j", "--workers", type = int, default = availableCores(), help = "number of worker processes (default: the available cores, %(default)s)")
+    run.add_argument("--chunk-size", type = int, default = 1, help = "files given at once to a worker (default: %(default)s)")
+    run.add_argument("--metrics", nargs = "+", default = DEFAULT_METRICS, choices = list(METRICS), metavar = "METRIC",
+                     help = f"metrics to compute, among {', '.join(METRICS)} (default: {' '.join(DEFAULT_METRICS)})")
+    run.add_argument("--durations", help = "JSON file of gate durations for criticalPathDuration, e.g. "
+                     '{"durations": {"cnot": 40, "measure": 300}, "defaultByArity": {"1": 20}, "default": 20} (default: 1 per gate)')
+    run.add_argument("--max-lines", type = int, help = "skip the files with more lines")
+    run.add_argument("--max-bytes", type = int, help = "skip the bigger files")
+    run.add_argument("--timeout", type = float, help = "seconds allowed per file")
+    run.add_argument("--memory-limit", type = int, help = "MiB of resident memory allowed per worker")
+    run.add_argument("--cache", default = CACHE_DIRECTORY, help = "directory of the result cache (default: %(default)s)")
+    run.add_argument("--no-cache", action = "store_true", help = "compute everything, and do not update the cache")
+    run.add_argument("--invalidate", nargs = "+", default = [], choices = list(METRICS), metavar = "METRIC", help = "compute these metrics again even if cached")
+    run.add_argument("--restart", action = "store_true", help = "start from scratch instead of resuming an interrupted run")
+
+    commands.add_parser("test", help = "run the tests of the batch runner")
+
+    # Without arguments, runs on metrics/data as the script always did.
+    args = parser.parse_args(["run"] if argv == [] else argv)
+    if args.command == "test":
+        test1()
         return
-    
+
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be at least 1")
+
+    # Stopping with SIGTERM (e.g. when a job is preempted) also writes the files that are done, as with Ctrl-C.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    fileNames = filterBySize(expandInputs(args.inputs), maxLines = args.max_lines, maxBytes = args.max_bytes)
+    processFiles(fileNames, outputFile = args.output, workers = args.workers, chunksize = args.chunk_size, timeout = args.timeout, memoryLimit = args.memory_limit,
+                 cacheDirectory = None if args.no_cache else args.cache, invalidate = args.invalidate, resume = not args.restart,
+                 outputFormat = args.format, metrics = args.metrics, durationModel = DurationModel.fromFile(args.durations) if args.durations else None)
+
+
+def test1():
+    # End to end on a loop whose numbers of paths (2^20000) have more digits than str() accepts,
+    # in CSV and NDJSON, computed and then read from the cache.
+    import csv, json, tempfile
+    from metrics.summaries import getProgramPathStats
+    with tempfile.TemporaryDirectory() as directory:
+        fileName = os.path.join(directory, "loop.qasm")
+        with open(fileName, "w") as f:
+            f.write("version 1.0\nqubits 2\n.loop(20000)\n  cnot q[0], q[1]\n  h q[0]\n  h q[1]\n")
+        expected = outputs.integerString(getProgramPathStats(parseCompactCQASMFile(fileName))["NumberOfCriticalPaths"])
+        assert len(expected) > 4300
+
+        for outputFile in ("out.csv", "out.ndjson"):
+            outputFile = os.path.join(directory, outputFile)
+            results = []
+            for _ in range(2):
+                processFiles([fileName], outputFile = outputFile, workers = 1, cacheDirectory = os.path.join(directory, "cache"), metrics = ["pathStats", "programPathStats"])
+                with open(outputFile, newline = "") as f:
+                    rows = list(csv.DictReader(f)) if outputFile.endswith(".csv") else [json.loads(line) for line in f]
+                assert [row["Status"] for row in rows] == ["ok", "ok"]
+                assert [row["NumberOfCriticalPaths"] for row in rows] == ["2", expected]
+                results.append(rows)
+            assert results[0] == results[1]
 
 
 if __name__ == "__main__":
-    # print(f"Will process files: {files}")
-
-    with open(OUTPUT_FILE, "w") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=statistics)
-        writer.writeheader()
-    
-    # for f in files:
-    #     print(f"processing {f}")
-    #     processFile(f)
-    
-    with Pool(8, initargs = (counter, )) as p:
-        p.map(processFile, files)
+    main(sys.argv[1:])